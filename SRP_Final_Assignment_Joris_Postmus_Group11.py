@@ -10,167 +10,329 @@ Description: This program runs a guitar note recognition game using a robot inte
              Check the provided readme for more information on how to run the program.
 
 Settings:
-- URLs for guitar note audio files.
-- URLs for success and fail audio files.
-- Number of rounds for the game.
+- Game script: the notes and their audio files, the sounds, the difficulty levels (rounds and notes),
+  the texts, the answers and the flow of the game (see game_script.json).
+- Difficulty to play (one of the difficulties of the game script, None for the default of the script).
+- Answer mode: say the name of the note ("speech"), the same but recognized while the user is still
+  talking ("stream") or sing/play the note back ("pitch").
+- Port of the local asset server that serves the (prefetched) audio files to the robot.
+- Directory the latency metrics and trace of every session are written to.
+- Directory every session is recorded to, so it can be replayed with session_log.py.
+- Directory the checkpoint of an unfinished game is kept in, so the game resumes where it stopped
+  when the connection to the robot dropped (the program reconnects on its own).
 """
 
+import itertools
+import os
 import random
+import time
 from autobahn.twisted.component import Component, run
 from twisted.internet.defer import inlineCallbacks
-from autobahn.twisted.util import sleep
+from asset_proxy import AssetProxy
+from action_plan import ActionPlan
+from tracing import TracedSession, traced_phase
+from pitch_detect import listen_for_note
+from answer_match import listen_for_answer
+from speech import say
+from session_log import SessionRecorder
+from reconnect import CheckpointStore, transport
+from game_script import load_script, run_script, DEFAULT_SCRIPT
 
 # SETTINGS
-chordURLS = {
-    "A": "https://audio.jukehost.co.uk/dNQshEWsKaC9CBTyaicXGXKNYMR1OO0H",
-    "C": "https://audio.jukehost.co.uk/0Ty2zDs2ieXrsGqao2jC24WffTT1ZC0i",
-    "D": "https://audio.jukehost.co.uk/7E8kkTF3ZbaLZFuCU4cdL6ZqCRlbImum",
-    "E": "https://audio.jukehost.co.uk/ZTjEP8GRbS98YPmshr2IPkF2UtJYUR6S",
-    "G": "https://audio.jukehost.co.uk/0C2dTo0xpBEnPWV2rMSJorYQUnB7izU9"
-}
-successURL = "https://audio.jukehost.co.uk/ExEdJnj8yolYaIX3SdjwX8asJukJ55gx"
-failURL = "https://audio.jukehost.co.uk/XNSKFJNIaJnHDvtssNsx9EjYDApqfHfD"
-NUM_ROUNDS = 5 # EASY MODE, feel free to reduce for testing purposes
+GAME_SCRIPT = DEFAULT_SCRIPT # game_script.json next to this file
+DIFFICULTY = None # e.g. "easy" or "quick", None plays the default difficulty of the game script
+ANSWER_MODE = "speech" # "speech": the player says the name of the note, "stream": the same, but the answer is recognized as soon as it is said, "pitch": the player sings or plays the note back
+ASSET_SERVER_PORT = 8765 # The robot streams the audio files from this machine on this port
+TRACE_DIR = "traces" # <realm>.prom (Prometheus metrics) and <realm>.json (call trace) are written here after every session
+RECORD_DIR = "recordings" # <realm>-<time>.log of every session, set to None to stop recording
+CHECKPOINT_DIR = "checkpoints" # <realm>.json with the last checkpoint of a game that did not finish, None keeps it in memory only
 
-@inlineCallbacks
-def main(session):
+SCRIPT = load_script(GAME_SCRIPT, DIFFICULTY)
+
+# All audio files are downloaded once at startup and served to the robot over the LAN
+assets = AssetProxy(SCRIPT.asset_urls(), port=ASSET_SERVER_PORT)
+
+# Where every unfinished game is, a session that joins after a reconnect resumes from it
+checkpoints = CheckpointStore(CHECKPOINT_DIR)
+
+# Number of every session of this run in its recording name, a rejoin in the same second gets its own log
+session_numbers = itertools.count(1)
+
+class GameState:
     """
-    Main function that runs the guitar note recognition game.
+    State of the game on one robot. Every session gets its own, so several robots can play from one process.
+    The notes are picked with its own random generator, a replay with the same seed plays the same notes.
+    With a checkpoint store, the state is saved before every step and every round, see resume_state.
     """
-    answer = yield game_intro(session)
+    def __init__(self, realm=None, seed=None, script=None):
+        self.realm = realm
+        self.seed = random.randrange(2**32) if seed is None else seed
+        self.random = random.Random(self.seed)
+        self.script = script or SCRIPT
+        self.step = None # Step of the game script that is running
+        self.round = 0
+        self.correct_answers = 0
+        self.current_note = None
+        self.planned_notes = [] # Notes of all the rounds, picked when the rounds start
+        self.playing_rounds = False # True from the first round until the last round is done
+        self.checkpoints = None # CheckpointStore the state is saved to
 
-    if answer == "Yes":
-        yield play_and_showcase_notes(session)
-        correct_answers = yield main_loop(session)
-        answer = yield play_again(session, correct_answers)
+    def checkpoint(self):
+        """
+        Everything needed to resume the game at this point (JSON), the random generator included so the next notes are the same too.
+        """
+        return {
+            "realm": self.realm,
+            "seed": self.seed,
+            "random": self.random.getstate(),
+            "step": self.step,
+            "round": self.round,
+            "correct_answers": self.correct_answers,
+            "current_note": self.current_note,
+            "planned_notes": list(self.planned_notes),
+            "playing_rounds": self.playing_rounds,
+        }
 
-        if answer == "Yes":
-            yield main_loop(session)
-        else:
-            yield session.call("rie.dialogue.say", text="Oh, well maybe some other time.")
-    else:
-        yield session.call("rie.dialogue.say", text="Oh, well maybe some other time.")
+    @classmethod
+    def from_checkpoint(cls, checkpoint, script=None):
+        state = cls(checkpoint["realm"], checkpoint["seed"], script)
+        version, internal, gauss = checkpoint["random"]
+        state.random.setstate((version, tuple(internal), gauss))
+        for name in ("step", "round", "correct_answers", "current_note", "planned_notes", "playing_rounds"):
+            setattr(state, name, checkpoint[name])
+        return state
+
+    def save_checkpoint(self):
+        if self.checkpoints is not None:
+            self.checkpoints.save(self.realm or "session", self.checkpoint())
 
+def resume_state(realm, seed=None):
+    """
+    GameState for a session that joins realm: the game that stopped there (the connection dropped) resumes
+    from its checkpoint, at the step and round it was in, with its score. Otherwise (also when the checkpoint
+    is an old one of an earlier run of the program) it is a new game (with seed).
+    """
+    saved = checkpoints.load(realm or "session")
+    state = GameState(realm, seed) if saved is None else GameState.from_checkpoint(saved)
+    state.checkpoints = checkpoints
+    if saved is not None:
+        print(f"Resuming the game at step {state.step}, round {state.round + 1}, with {state.correct_answers} correct answers")
+    return state
+
+@inlineCallbacks
+def main(session, state=None):
+    """
+    Main function that runs the guitar note recognition game, following the flow of the game script.
+    """
+    if state is None:
+        state = GameState()
+    yield run_script(session, state, PHASES, on_step=GameState.save_checkpoint)
+    if state.checkpoints is not None:
+        state.checkpoints.clear(state.realm or "session") # Done, the next session starts a new game
     session.leave()
 
 @inlineCallbacks
-def game_intro(session):
+def run_traced(session, state=None):
+    """
+    Runs the game with every robot call traced (and recorded), writes the metrics and prints a summary when the game is done.
+    """
+    if state is None:
+        state = GameState()
+    name = state.realm or "session"
+    recorder = None
+    if RECORD_DIR:
+        os.makedirs(RECORD_DIR, exist_ok=True)
+        path = os.path.join(RECORD_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{next(session_numbers)}.log")
+        resumed = state.checkpoint() if state.step is not None else None
+        session = recorder = SessionRecorder(session, path, state.realm, state.seed, resumed)
+    traced = TracedSession(session, name=name)
+    try:
+        yield main(traced, state)
+    finally:
+        if recorder is not None:
+            recorder.close()
+        traced.export(TRACE_DIR)
+        print(traced.summary())
+
+@traced_phase
+@inlineCallbacks
+def game_intro(session, state=None):
     """
     Introduce the game and ask if the user is ready to play.
+    The robot starts talking as soon as the language is set and looks for a face while it talks,
+    the welcome (with the wave) does not wait for the face, so the face line can be commented out on its own.
     """
-    yield session.call("rom.sensor.hearing.info")
-    yield session.call("rie.dialogue.config.language", lang="en")
+    script = (state or GameState()).script
+    plan = ActionPlan()
+    plan.call("rom.sensor.hearing.info")
+    language = plan.call("rie.dialogue.config.language", lang="en")
 
-    print("Robot is looking for a face, if the robot appears to freeze, check the code and uncomment the line that makes the robot look at the user first. (Line 66)")
-    yield session.call("rie.dialogue.say", text=f"What a beautiful day to learn some guitar notes. Let me look at you first.")
-    yield session.call("rie.vision.face.find") # Makes the robot look at the user first, please uncomment if the program appears to freeze, this functionality does not work as well on all robots.
-    yield session.call("rom.optional.behavior.play", name="BlocklyWaveRightArm")
-    yield session.call("rie.dialogue.say", text="Hi there! It is really nice to see you. My name is Guitary and today I am going to teach you to recognize the 5 most important guitar notes. Namely the notes A, C, D, E and G. Did you know that you can play almost all popular songs using these? For this game, I will randomly play one of those notes and you have to guess which one it is. Each time you guess correctly you will score a point.")
-    yield session.call("rie.dialogue.say", text=f"This will be the Easy mode, so you will only need to recognize one note at a time for {NUM_ROUNDS} rounds.")
+    print("Robot is looking for a face, if the robot appears to freeze, check the code and comment out the rie.vision.face.find line in game_intro that makes the robot look at the user first.")
+    look = plan.step(say, script.say_chunks("look"), after=[language])
+    plan.call("rie.vision.face.find") # Makes the robot look at the user first, please comment out if the program appears to freeze, this functionality does not work as well on all robots.
+    welcome = script.say_chunks("welcome") + script.say_chunks("mode") # One pipeline, no pause between the two
+    plan.step(say, welcome, gestures={0: script.behaviors["wave"]}, after=[look])
+    yield plan.run(session)
 
-    question = "Are you ready?"
-    answers = {"Yes": ["yes", "jes", "yus", "ja"], "No": ["no", "nee", "nay"]}
-    yield session.call("rom.optional.behavior.play", name="BlocklyWaveRightArm")
-    answer = yield session.call("rie.dialogue.ask", question=question, answers=answers)
+    yield session.call("rom.optional.behavior.play", name=script.behaviors["wave"])
+    answer = yield ask(session, script, script.say("ready"), "yes_no")
     print(answer)
 
     return answer
 
+@traced_phase
 @inlineCallbacks
-def play_and_showcase_notes(session):
+def play_and_showcase_notes(session, state=None):
     """
     Function that plays and showcases the guitar notes to the player.
+    The robot waves while it talks, and strums (arms forward) while each note is announced and played.
     """
-    yield session.call("rom.optional.behavior.play", name="BlocklyWaveRightArm")
-    yield session.call("rie.dialogue.say", text="All right, let me play all the notes for you to start with, try to memorize them as well as you can.")
-    notes = ["A", "C", "D", "E", "G"]
-    for note in notes:
-        yield session.call("rie.dialogue.say", text=f"Let me play the following note for you. {note}.")
-        yield session.call("rom.optional.behavior.play", name="BlocklyArmsForward") # This kind of looks like the robot is playing a guitar
-        yield sleep(1)
-        yield session.call("rom.actuator.audio.stream", url=chordURLS[note], sync=False)
-        yield sleep(1)
+    script = (state or GameState()).script
+    plan = ActionPlan()
+    wave = plan.call("rom.optional.behavior.play", name=script.behaviors["wave"])
+    previous = [wave, plan.step(say, script.say_chunks("showcase"))]
+    for note in script.note_set:
+        announce = plan.step(say, script.say_chunks("showcase_note", note=note), after=previous)
+        strum = plan.call("rom.optional.behavior.play", name=script.behaviors["strum"], after=previous) # This kind of looks like the robot is playing a guitar
+        sound = plan.call("rom.actuator.audio.stream", url=assets.url(script.notes[note]), sync=True, after=[announce])
+        previous = [strum, sound]
+    yield plan.run(session)
 
+@traced_phase
 @inlineCallbacks
-def main_loop(session):
+def main_loop(session, state=None):
     """
     Function that runs the main loop of the guitar note recognition game.
+    The notes of all the rounds are planned up front, while a round is played the audio files of the next
+    round are made ready. The score and the current note are kept in state (a new GameState when not given).
+    Every round starts with a checkpoint, a game that resumes after a dropped connection plays the round it stopped in again.
     """
-    correct_answers = 0
-    notes = ["A", "C", "D", "E", "G"]
-    
-    for _ in range(NUM_ROUNDS):
-        yield session.call("rie.dialogue.say", text="Alright, let me play one of the notes, please try to recognize it")
-        
-        random_note = random.choice(notes)
+    if state is None:
+        state = GameState()
+    script = state.script
+    if not state.playing_rounds: # Otherwise the rounds were planned before the connection dropped
+        state.correct_answers = 0
+        state.planned_notes = script.plan_rounds(state.random)
+        state.round = 0
+        state.playing_rounds = True
+    upcoming = assets.warm(script.round_urls(state.planned_notes[state.round])) if state.planned_notes else None
+
+    for state.round in range(state.round, len(state.planned_notes)):
+        random_note = state.planned_notes[state.round]
+        state.save_checkpoint()
+        yield upcoming # Usually ready long before, it was started during the previous round
+        if state.round + 1 < len(state.planned_notes):
+            upcoming = assets.warm(script.round_urls(state.planned_notes[state.round + 1]))
+
+        yield say(session, script.say_chunks("round"))
+
+        state.current_note = random_note
         print("The note played is: " + random_note)
-        
-        yield session.call("rom.actuator.audio.stream", url=chordURLS[random_note], sync=False)
-        yield sleep(2)
 
-        question = "Could you please tell me what note I just played?"
-        answers = {note: [note, note.lower()] for note in notes}
+        yield session.call("rom.actuator.audio.stream", url=assets.url(script.notes[random_note]), sync=True)
 
-        answer = yield session.call("rie.dialogue.ask", question=question, answers=answers)
+        if ANSWER_MODE == "pitch":
+            yield say(session, script.say_chunks("question_pitch"))
+            answer = yield listen_for_note(session)
+        else:
+            answer = yield ask(session, script, script.say("question"), "notes")
         print(answer)
 
         if answer == random_note:
-            yield correct_answer(session)
-            correct_answers += 1
+            yield correct_answer(session, state)
+            state.correct_answers += 1
         else:
-            yield incorrect_answer(session, random_note)
+            yield incorrect_answer(session, state)
 
-    return correct_answers
+    state.playing_rounds = False
+    return state.correct_answers
 
+@traced_phase
 @inlineCallbacks
-def play_again(session, correct_answers):
+def play_again(session, state):
     """
     Informs the user of their score and asks them if they would like to play again.
     """
-    question = f"You scored: {correct_answers}, would you like to play again?"
-    answers = {"Yes": ["yes", "jes", "yus", "ja"], "No": ["no", "nee", "nay"]}
+    script = state.script
+    score = state.correct_answers
+
+    if score >= int(script.rounds/2):
+        yield say(session, script.say_chunks("good_score", score=score))
+        yield session.call("rom.optional.behavior.play", name=script.behaviors["dance"])
+    else:
+        yield say(session, script.say_chunks("bad_score", score=score))
+        yield session.call("rom.optional.behavior.play", name=script.behaviors["shrug"])
+
+    answer = yield ask(session, script, script.say("play_again", score=score), "yes_no")
+    return answer
+
+@traced_phase
+@inlineCallbacks
+def goodbye(session, state=None):
+    """
+    Says goodbye when the user does not want to play (again).
+    """
+    script = (state or GameState()).script
+    yield say(session, script.say_chunks("goodbye"))
 
-    if correct_answers >= int(NUM_ROUNDS/2):
-        yield session.call("rie.dialogue.say", text=f"{correct_answers} is a really good score by the way, you're getting the hang of this! Let's celebrate!")
-        yield session.call("rom.optional.behavior.play", name="BlocklyRobotDance")
+@inlineCallbacks
+def ask(session, script, question, answers):
+    """
+    Asks a question, answers is the name of the answers in the game script ("yes_no" or "notes").
+    In the "stream" answer mode the answer is matched on the transcript while the user talks, instead of with rie.dialogue.ask.
+    """
+    if ANSWER_MODE == "stream":
+        answer = yield listen_for_answer(session, question, script.answer_index(answers))
     else:
-        yield session.call("rie.dialogue.say", text=f"{correct_answers} is not a bad start, you will get there next time. Let's aim for a better score next time!")
-        yield session.call("rom.optional.behavior.play", name="BlocklyShrug")
-    
-    answer = yield session.call("rie.dialogue.ask", question=question, answers=answers)
+        answer = yield session.call("rie.dialogue.ask", question=question, answers=script.ask_answers(answers))
     return answer
 
+@traced_phase
 @inlineCallbacks
-def correct_answer(session):
+def correct_answer(session, state=None):
     """
     Function that handles a correct answer by playing a positive sound, movement, and verbal queue.
+    The robot applauds during the sound and while it says the verbal queue.
     """
-    yield session.call("rom.actuator.audio.stream", url=successURL, sync=False)
-    yield session.call("rom.optional.behavior.play", name="BlocklyApplause")
-    yield session.call("rie.dialogue.say", text="Good job you guessed the note! You get one point.")
+    script = (state or GameState()).script
+    plan = ActionPlan()
+    sound = plan.call("rom.actuator.audio.stream", url=assets.url(script.sounds["success"]), sync=True)
+    plan.call("rom.optional.behavior.play", name=script.behaviors["applause"])
+    plan.step(say, script.say_chunks("correct"), after=[sound])
+    yield plan.run(session)
 
+@traced_phase
 @inlineCallbacks
-def incorrect_answer(session, random_note):
+def incorrect_answer(session, state):
     """
     Function that handles an incorrect answer by playing a negative sound, movement, and verbal queue.
+    The robot shrugs during the sound, the note (state.current_note) is replayed after the verbal queue.
     """
-    yield session.call("rom.actuator.audio.stream", url=failURL, sync=False)
-    yield session.call("rom.optional.behavior.play", name="BlocklyShrug")
-    yield sleep(1)
-    yield session.call("rie.dialogue.say", text=f"Sorry, but I don't think that was the answer. I played the: {random_note} note. Here is what the {random_note} note sounds like, please remember it for next time")
-    yield session.call("rom.actuator.audio.stream", url=chordURLS[random_note], sync=False)
-    yield sleep(2)
+    script = state.script
+    random_note = state.current_note
+    plan = ActionPlan()
+    sound = plan.call("rom.actuator.audio.stream", url=assets.url(script.sounds["fail"]), sync=True)
+    plan.call("rom.optional.behavior.play", name=script.behaviors["shrug"])
+    told = plan.step(say, script.say_chunks("incorrect", note=random_note), after=[sound])
+    plan.call("rom.actuator.audio.stream", url=assets.url(script.notes[random_note]), sync=True, after=[told])
+    yield plan.run(session)
+
+# The phases the steps of the game script can run
+PHASES = {
+    "game_intro": game_intro,
+    "play_and_showcase_notes": play_and_showcase_notes,
+    "main_loop": main_loop,
+    "play_again": play_again,
+    "goodbye": goodbye,
+}
 
 wamp = Component(
-    transports=[{
-        "url": "ws://wamp.robotsindeklas.nl",
-        "serializers": ["msgpack"],
-        "max_retries": 2
-    }],
+    transports=[transport("ws://wamp.robotsindeklas.nl")], # Reconnects (with backoff) when the connection drops
     realm="rie.666ab353961f249628fc272e", # Make sure to change this to your own realm
 )
 
-wamp.on_join(lambda session, _: main(session))
+wamp.on_join(lambda session, details: run_traced(session, resume_state(details.realm)))
 
 if __name__ == "__main__":
+    assets.start()
     run([wamp])
@@ -0,0 +1,89 @@
+"""
+Description: Small action-plan API to run the robot calls of a game step concurrently.
+             A step declares its calls and which calls have to wait for which other
+             calls. When the plan runs, every call starts as soon as the calls it depends
+             on have completed, so independent motion, audio and speech calls overlap and
+             no fixed sleeps are needed to wait for audio to finish (use sync=True instead).
+
+Example:
+    plan = ActionPlan()
+    sound = plan.call("rom.actuator.audio.stream", url=successURL, sync=True)
+    plan.call("rom.optional.behavior.play", name="BlocklyApplause")
+    plan.call("rie.dialogue.say", text="Good job!", after=[sound])
+    plan.step(speech.say, "Well done.", after=[sound])  # A function of the session that returns a Deferred
+    yield plan.run(session)
+"""
+
+from twisted.internet.defer import Deferred, DeferredList, FirstError, succeed
+from twisted.python.failure import Failure
+
+
+class ActionPlan:
+    """
+    Calls of one game step together with the dependencies between them.
+    """
+
+    def __init__(self):
+        self._actions = []  # (function of the session, indices of the actions it waits for)
+
+    def call(self, procedure, after=(), **kwargs):
+        """
+        Adds a session.call to the plan, returns a handle that later calls can depend on.
+        Only handles of calls that were already added can be used in after, so a plan has no cycles.
+        """
+        return self._add(lambda session: session.call(procedure, **kwargs), after)
+
+    def step(self, function, *args, after=(), **kwargs):
+        """
+        Adds function(session, *args, **kwargs) to the plan (it returns a Deferred), like call does for a session.call.
+        """
+        return self._add(lambda session: function(session, *args, **kwargs), after)
+
+    def _add(self, action, after):
+        for handle in after:
+            if not 0 <= handle < len(self._actions):
+                raise ValueError(f"Unknown action {handle} in after")
+        self._actions.append((action, tuple(after)))
+        return len(self._actions) - 1
+
+    def run(self, session):
+        """
+        Runs the plan, returns a Deferred that fires with the results of all calls (in the order they were added).
+        """
+        started = []
+        for action, after in self._actions:
+            if after:
+                ready = DeferredList([branch(started[i]) for i in after], fireOnOneErrback=True, consumeErrors=True)
+            else:
+                ready = succeed(None)
+            d = ready.addCallback(lambda _, action=action: action(session))
+            started.append(d)
+
+        results = DeferredList(started, fireOnOneErrback=True, consumeErrors=True)
+        return results.addCallbacks(lambda results: [result for _, result in results], _first_error)
+
+
+def branch(d):
+    """
+    New Deferred that fires with the result of d, without taking that result away from d's own callbacks.
+    """
+    copy = Deferred()
+
+    def fire(result):
+        if isinstance(result, Failure):
+            copy.errback(result)
+        else:
+            copy.callback(result)
+        return result
+
+    d.addBoth(fire)
+    return copy
+
+
+def _first_error(failure):
+    """
+    Unwraps the FirstError(s) of the DeferredLists so callers see the failure of the call itself.
+    """
+    while failure.check(FirstError):
+        failure = failure.value.subFailure
+    return failure
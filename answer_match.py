@@ -0,0 +1,189 @@
+"""
+Description: Local answer recognition on the streaming transcript of the robot, as a faster rie.dialogue.ask.
+             rie.dialogue.ask only returns after the player stopped talking (and the robot waited for
+             the silence after it). AnswerIndex compiles the accepted words of every answer once:
+             their normalized forms, their phonetic keys (so "see" and "sea" both give C) and a trie,
+             which tells whether a word that is still being said can only become one answer.
+             A partial transcript only matches on accepted words, a word that only sounds like
+             one ("now" like "no", "see" in "let me see") is only taken from the final transcript,
+             when it has no accepted word.
+             listen_for_answer asks the question, reads the partial transcripts of the speech
+             recognition as they come in and returns as soon as a transcript matches one answer,
+             then stops the listening. A final transcript without a match gives None, like an
+             answer that was not understood.
+
+Example:
+    index = AnswerIndex({"Yes": ["yes", "ja"], "No": ["no", "nee"]})
+    index.match("uhm yes please", final=False)  # "Yes", the word after it does not matter
+"""
+
+import functools
+import re
+import unicodedata
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, inlineCallbacks
+
+LISTEN_TIMEOUT = 10  # Seconds to wait for an answer
+TRANSCRIPT_TOPIC = "rie.dialogue.stt.stream"
+
+# How letters sound when they are said on their own, so "c" gets the same key as "see"
+LETTER_NAMES = {"a": "ay", "b": "bee", "c": "see", "d": "dee", "e": "ee", "f": "ef", "g": "jee", "h": "aitch",
+                "i": "eye", "j": "jay", "k": "kay", "l": "el", "m": "em", "n": "en", "o": "oh", "p": "pee",
+                "q": "kew", "r": "ar", "s": "es", "t": "tee", "u": "you", "v": "vee", "w": "doubleyou",
+                "x": "ex", "y": "why", "z": "zed"}
+_SOUNDS = [("ph", "f"), ("ck", "k"), ("sch", "sk"), ("th", "0"), ("dg", "j"), ("wh", "w"),
+           ("c(?=[eiy])", "s"), ("g(?=[eiy])", "j"), ("c", "k"), ("q", "k"), ("x", "ks"), ("z", "s")]
+_SOUNDS = [(re.compile(pattern), sound) for pattern, sound in _SOUNDS]
+_VOWELS = re.compile(r"^[aeiou][aeiouy]*|(?<=.)[aeiouy]+")
+_SILENT = re.compile(r"(?<=.)[hw](?![aeiouy])")
+_DOUBLES = re.compile(r"(.)\1+")
+_WORD = re.compile(r"[a-z0-9']+")
+COMMON_WORDS = {"a", "i", "o"}  # Also said when they are not the answer ("it is a C"), only used when nothing else matched
+FILLER_WORDS = {"uh", "uhm", "um", "eh", "ehm", "er", "erm", "hm", "hmm", "mm"}  # Never an answer by their sound
+
+
+def normalize(text):
+    """
+    Lower case words without accents and punctuation.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    return " ".join(_WORD.findall(text.encode("ascii", "ignore").decode()))
+
+
+@functools.lru_cache(maxsize=4096)  # Every partial transcript repeats the words of the one before
+def phonetic_key(word):
+    """
+    Rough sound of a normalized word: consonants that sound alike are the same, every run of vowels is its first vowel.
+    """
+    word = LETTER_NAMES.get(word, word)
+    for pattern, sound in _SOUNDS:
+        word = pattern.sub(sound, word)
+    word = _SILENT.sub("", word)
+    word = _VOWELS.sub(lambda vowels: vowels.group()[0], word)
+    return _DOUBLES.sub(r"\1", word)
+
+
+class _TrieNode:
+    __slots__ = ("children", "answers")
+
+    def __init__(self):
+        self.children = {}
+        self.answers = set()  # Answers of all the words that start with the path to this node
+
+
+class AnswerIndex:
+    """
+    The answers dict of rie.dialogue.ask ({answer: [accepted words]}) compiled for matching transcripts.
+    """
+
+    def __init__(self, answers):
+        self.answers = answers
+        self._words = {}  # normalized word -> answer
+        self._keys = {}  # phonetic key -> answers
+        self._longest = 1  # Most words in an accepted phrase
+        self._trie = _TrieNode()
+        for answer, words in answers.items():
+            for word in words:
+                word = normalize(word)
+                if not word:
+                    continue
+                self._words.setdefault(word, answer)
+                self._longest = max(self._longest, word.count(" ") + 1)
+                if " " not in word:
+                    self._keys.setdefault(phonetic_key(word), set()).add(answer)
+                node = self._trie
+                node.answers.add(answer)
+                for char in word:
+                    node = node.children.setdefault(char, _TrieNode())
+                    node.answers.add(answer)
+
+    def completions(self, prefix):
+        """
+        The answers that have an accepted word starting with prefix.
+        """
+        node = self._trie
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return node.answers
+
+    def _sound_answer(self, word):
+        if word in FILLER_WORDS or word in COMMON_WORDS:  # Never by its sound, "i" sounds like E
+            return None
+        answers = self._keys.get(phonetic_key(word), ())
+        return next(iter(answers)) if len(answers) == 1 else None
+
+    def _find(self, words, final, by_sound):
+        """
+        The first answer in words: an accepted word or phrase, with by_sound also a word that sounds like one.
+        """
+        for start in range(len(words)):
+            for length in range(min(self._longest, len(words) - start), 0, -1):
+                phrase = " ".join(words[start:start + length])
+                answer = self._words.get(phrase)
+                if answer is None and by_sound and length == 1:
+                    answer = self._sound_answer(phrase)
+                if answer is None or phrase in COMMON_WORDS:
+                    continue
+                if final or start + length < len(words) or self.completions(phrase) <= {answer}:
+                    return answer
+                return None  # The last word can still become another answer, wait for more
+        return None
+
+    def match(self, transcript, final=False):
+        """
+        The first answer in the transcript, or None. In a partial transcript the last word can still change,
+        it only counts when every word it can still become belongs to the same answer.
+        Words that only sound like an answer, and common words (like "a"), only count in a final
+        transcript without an accepted word, in that order.
+        """
+        words = normalize(transcript).split()
+        answer = self._find(words, final, by_sound=False)
+        if answer is None and final:
+            answer = self._find(words, final, by_sound=True)
+        if answer is None and final:
+            answer = next((self._words[word] for word in words if word in COMMON_WORDS and word in self._words), None)
+        return answer
+
+
+def transcript(frame):
+    """
+    (text, final) of a frame of the transcript stream: {"data": {"text": ..., "final": ...}} (also inside "body"), or the text itself.
+    """
+    if isinstance(frame, str):
+        return frame, False
+    data = frame.get("data", frame)
+    data = data.get("body", data)
+    return data.get("text") or "", bool(data.get("final", False))
+
+
+@inlineCallbacks
+def listen_for_answer(session, question, index, timeout=LISTEN_TIMEOUT):
+    """
+    Asks question and returns the answer of index as soon as the transcript matches one, or None when the player
+    finished talking without a match or nothing matched within timeout.
+    """
+    heard = Deferred()
+
+    def on_frame(frame):
+        if heard.called:
+            return
+        text, final = transcript(frame)
+        answer = index.match(text, final)
+        if answer is not None or final:
+            heard.callback(answer)
+
+    subscription = yield session.subscribe(on_frame, TRANSCRIPT_TOPIC)
+    yield session.call("rie.dialogue.say", text=question)
+    yield session.call("rie.dialogue.stt.stream")
+    timer = reactor.callLater(timeout, lambda: heard.called or heard.callback(None))
+    try:
+        answer = yield heard
+    finally:
+        if timer.active():
+            timer.cancel()
+        yield session.call("rie.dialogue.stt.close")  # Stop listening, the rest of the answer is not needed
+        yield subscription.unsubscribe()
+    return answer
@@ -0,0 +1,292 @@
+"""
+Description: Local HTTP asset server for the audio files the robot streams.
+             All the remote audio files (guitar notes, success and fail sounds) are
+             prefetched at startup into a size-bounded LRU cache on disk and served from
+             this machine, so the robot streams them over the LAN instead of fetching them
+             from the remote host every round. Cached files are revalidated against the
+             origin with ETag/Last-Modified (conditional GET) once they are older than max_age.
+"""
+
+import hashlib
+import json
+import os
+import re
+import socket
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+
+from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks, DeferredList, succeed
+from twisted.internet.threads import deferToThread
+from twisted.web.resource import Resource, NoResource
+from twisted.web.server import Site
+from twisted.web.static import File
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024  # 50 MB is plenty for a couple of short sound clips
+DEFAULT_MAX_AGE = 3600  # Seconds before a cached file is revalidated with the origin
+_SERVED_URL = re.compile(r"^https?://[^/]+/assets/([0-9a-f]{20})$")  # url() of a cached file
+
+
+def asset_key(url):
+    """
+    Stable cache key (and file name) of a remote url.
+    """
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()[:20]
+
+
+def served_key(url):
+    """
+    Cache key of url, the same for the original url and the url a proxy (on any host and port) serves it at.
+    """
+    match = _SERVED_URL.match(url)
+    return match.group(1) if match else asset_key(url)
+
+
+def lan_address(probe_host="wamp.robotsindeklas.nl"):
+    """
+    Returns the address of this machine on the network that reaches the robot hub.
+    Nothing is actually sent, connecting an UDP socket only picks the outgoing interface.
+    """
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect((probe_host, 80))
+            return s.getsockname()[0]
+    except OSError:
+        return "127.0.0.1"
+
+
+def fetch(url, etag=None, last_modified=None, timeout=10):
+    """
+    Blocking (conditional) GET of a url, meant to run in a thread.
+    Returns (status, body, headers), body is None when the origin answered 304 Not Modified.
+    headers is the message of the response, it looks names up case-insensitively ("Etag" is "ETag").
+    """
+    request = urllib.request.Request(url, headers={"User-Agent": "Guitary-asset-proxy"})
+    if etag:
+        request.add_header("If-None-Match", etag)
+    if last_modified:
+        request.add_header("If-Modified-Since", last_modified)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, response.read(), response.headers
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return 304, None, e.headers
+        raise
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        while f.read(1 << 16):
+            pass
+
+
+class AssetCache:
+    """
+    Size-bounded LRU cache of downloaded files on disk.
+    The index (url, validators, size, last check) is kept in index.json next to the files.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._entries = OrderedDict()  # Least recently used first
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path) as f:
+            entries = json.load(f)
+        for key, entry in entries:
+            if os.path.exists(self.path(key)):
+                self._entries[key] = entry
+
+    def _save_index(self):
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(list(self._entries.items()), f)
+        os.replace(tmp_path, self._index_path)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    @property
+    def total_bytes(self):
+        return sum(entry["size"] for entry in self._entries.values())
+
+    def get(self, key):
+        """
+        Returns the index entry of a cached file and marks it as most recently used.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, url, body, headers):
+        """
+        Stores a downloaded file, evicting the least recently used files when over max_bytes.
+        """
+        tmp_path = self.path(key) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, self.path(key))
+        self._entries[key] = {
+            "url": url,
+            "size": len(body),
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "content_type": headers.get("Content-Type", "application/octet-stream"),
+            "checked": time.time(),
+        }
+        self._entries.move_to_end(key)
+        self._evict(keep=key)
+        self._save_index()
+
+    def touch(self, key, headers):
+        """
+        Records a successful revalidation (304 Not Modified) of a cached file.
+        """
+        entry = self._entries.get(key)
+        if entry is None:  # Evicted while it was being revalidated
+            return
+        entry["checked"] = time.time()
+        entry["etag"] = headers.get("ETag", entry["etag"])
+        entry["last_modified"] = headers.get("Last-Modified", entry["last_modified"])
+        self._save_index()
+
+    def _evict(self, keep):
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            del self._entries[key]
+            os.remove(self.path(key))
+
+
+class _AssetsResource(Resource):
+    """
+    Serves /assets/<key> from the cache, revalidating stale files in the background.
+    """
+
+    def __init__(self, proxy):
+        Resource.__init__(self)
+        self.proxy = proxy
+
+    def getChild(self, path, request):
+        key = path.decode("ascii", "replace")
+        entry = self.proxy.cache.get(key)
+        if entry is None:
+            return NoResource()
+        if time.time() - entry["checked"] > self.proxy.max_age:
+            self.proxy.refresh(entry["url"])  # Serve the cached copy now, update it for next time
+        return File(self.proxy.cache.path(key), defaultType=entry["content_type"])
+
+
+class AssetProxy:
+    """
+    Prefetches remote audio files and serves them to the robot from the local network.
+    """
+
+    def __init__(self, urls, cache_dir=".asset_cache", max_bytes=DEFAULT_MAX_BYTES,
+                 port=DEFAULT_PORT, host=None, max_age=DEFAULT_MAX_AGE):
+        self.urls = list(urls)
+        self.cache = AssetCache(cache_dir, max_bytes)
+        self.port = port
+        self.host = host
+        self.max_age = max_age
+        self._listening = None
+        self._refreshing = {}
+
+    @inlineCallbacks
+    def start(self):
+        """
+        Starts the HTTP server and prefetches (or revalidates) all the urls.
+        Nothing blocks the reactor, so the game can connect to the robot in the meantime.
+        """
+        prefetched = self.prefetch()
+        if self.host is None:
+            self.host = yield deferToThread(lan_address)  # Looks up the robot hub, that can take a while
+        root = Resource()
+        root.putChild(b"assets", _AssetsResource(self))
+        self._listening = reactor.listenTCP(self.port, Site(root))
+        self.port = self._listening.getHost().port  # In case port 0 was asked for
+        yield prefetched
+
+    def stop(self):
+        if self._listening is not None:
+            return self._listening.stopListening()
+
+    def prefetch(self):
+        """
+        Downloads every url that is not cached yet, and revalidates the ones that are.
+        """
+        return DeferredList([self.refresh(url) for url in self.urls], consumeErrors=True)
+
+    def warm(self, urls):
+        """
+        Gets the urls ready before the robot needs them: reads the cached ones once, so they are in memory, and
+        starts downloading the missing and revalidating the stale ones in the background. The returned Deferred
+        only waits for the local reads, never for the origin (until a download is done, url() gives the original
+        url, and a stale copy is served as it is, like _AssetsResource does). Does nothing when the server is not running.
+        """
+        if self._listening is None:
+            return succeed(None)
+        reads = []
+        for url in urls:
+            key = asset_key(url)
+            entry = self.cache.get(key)
+            if entry is None or time.time() - entry["checked"] > self.max_age:
+                self.refresh(url)  # Reports its own failures
+            if entry is not None:
+                reads.append(deferToThread(_read, self.cache.path(key)))
+        return DeferredList(reads, consumeErrors=True)
+
+    def refresh(self, url):
+        """
+        (Re)downloads a single url with a conditional GET, only one refresh per url at a time.
+        """
+        key = asset_key(url)
+        if key in self._refreshing:
+            return self._refreshing[key]
+
+        entry = self.cache.get(key)
+        etag = entry["etag"] if entry else None
+        last_modified = entry["last_modified"] if entry else None
+        d = deferToThread(fetch, url, etag, last_modified)
+
+        def stored(result):
+            status, body, headers = result
+            if body is None:
+                self.cache.touch(key, headers)
+            else:
+                self.cache.put(key, url, body, headers)
+            return key
+
+        def failed(failure):
+            print(f"Could not fetch {url}: {failure.getErrorMessage()}")
+            return None
+
+        def done(result):
+            del self._refreshing[key]
+            return result
+
+        d.addCallbacks(stored, failed)
+        d.addBoth(done)
+        self._refreshing[key] = d
+        return d
+
+    def url(self, url):
+        """
+        Returns the LAN url of a cached file, or the original url when it is not cached (yet).
+        """
+        key = asset_key(url)
+        if self._listening is None or self.cache.get(key) is None:
+            return url
+        return f"http://{self.host}:{self.port}/assets/{key}"
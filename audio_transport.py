@@ -0,0 +1,77 @@
+"""
+Description: Sends decoded audio to rom.actuator.audio.play as compact, chunked PCM.
+             Samples are converted to 16 bit PCM at the playback rate of the robot, one chunk
+             at a time into a few reused buffers, and every chunk is handed to the serializer as a
+             memoryview of its buffer, so no copies of the clip are made on the way to the wire.
+             A buffer is only reused once the call of its chunk is done, so wrappers that look at
+             the arguments of a call when it completes (recording, tracing) see the right bytes.
+             Long clips are sent in chunks of CHUNK_SECONDS, with the next chunk already on its
+             way while the robot plays the current one, so playback starts after the first chunk
+             arrived instead of after the whole clip.
+"""
+
+from collections import deque
+
+import numpy as np
+from twisted.internet.defer import inlineCallbacks
+
+from note_audio import ROBOT_SAMPLE_RATE
+
+CHUNK_SECONDS = 0.5
+MAX_IN_FLIGHT = 2  # Chunks sent but not played yet
+
+
+def resample(samples, rate, target_rate):
+    """
+    Linear interpolation of samples from rate to target_rate.
+    """
+    if rate == target_rate:
+        return samples
+    positions = np.arange(int(len(samples) * target_rate / rate)) * (rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+class PcmChunker:
+    """
+    Turns samples into 16 bit PCM chunks, the chunks take turns in a few reused buffers.
+    """
+
+    def __init__(self, chunk_samples, buffers=MAX_IN_FLIGHT + 1):
+        self.chunk_samples = chunk_samples
+        self._scaled = np.empty(chunk_samples, dtype=np.float32)
+        self._pcm = [np.empty(chunk_samples, dtype="<i2") for _ in range(buffers)]
+
+    def chunks(self, samples):
+        """
+        Yields the PCM bytes of every chunk as a memoryview, which stays valid until buffers more chunks were made
+        (the chunks in flight and the one being made). Samples are int16 (sent as they are) or floats between -1 and 1.
+        """
+        n = self.chunk_samples
+        if samples.dtype == np.dtype("<i2") and samples.flags.c_contiguous:
+            for start in range(0, len(samples), n):
+                yield memoryview(samples[start:start + n]).cast("B")
+            return
+        for number, start in enumerate(range(0, len(samples), n)):
+            part = samples[start:start + n]
+            scaled, pcm = self._scaled[:len(part)], self._pcm[number % len(self._pcm)][:len(part)]
+            np.clip(part, -1, 1, out=scaled)
+            np.multiply(scaled, 32767, out=scaled)
+            np.copyto(pcm, scaled, casting="unsafe")
+            yield memoryview(pcm).cast("B")
+
+
+@inlineCallbacks
+def play(session, samples, rate=ROBOT_SAMPLE_RATE, chunk_seconds=CHUNK_SECONDS):
+    """
+    Plays samples on the robot, returns when the last chunk has been played.
+    At most MAX_IN_FLIGHT chunks are in flight, their buffers are not reused before their calls are done.
+    """
+    samples = resample(np.asarray(samples), rate, ROBOT_SAMPLE_RATE)
+    chunker = PcmChunker(int(chunk_seconds * ROBOT_SAMPLE_RATE))
+    in_flight = deque()
+    for chunk in chunker.chunks(samples):
+        in_flight.append(session.call("rom.actuator.audio.play", data=chunk, rate=ROBOT_SAMPLE_RATE, sync=True))
+        if len(in_flight) >= MAX_IN_FLIGHT:
+            yield in_flight.popleft()
+    while in_flight:
+        yield in_flight.popleft()
@@ -0,0 +1,76 @@
+"""
+Description: Benchmark of the concurrent action plans against the old sequential game steps.
+             The sequential steps below are the game code from before the action plans (every call
+             after the other, with the fixed sleeps), kept here as the baseline since the game no
+             longer has them. Both versions run against a simulated robot on a virtual clock, so the
+             benchmark takes no real time and the numbers only depend on the simulated call durations.
+             Run it with: python bench_action_plan.py
+"""
+
+from twisted.internet import task
+from twisted.internet.defer import inlineCallbacks
+
+import SRP_Final_Assignment_Joris_Postmus_Group11 as game
+from simulated_robot import InProcessSession, SimulatedRobot, ROBOT_LATENCY, run_on_clock
+
+
+# The game steps as they were before the action plans: every call after the other, with sleeps
+@inlineCallbacks
+def sequential_play_and_showcase_notes(session, sleep):
+    yield session.call("rom.optional.behavior.play", name="BlocklyWaveRightArm")
+    yield session.call("rie.dialogue.say", text="All right, let me play all the notes for you to start with, try to memorize them as well as you can.")
+    for note in ["A", "C", "D", "E", "G"]:
+        yield session.call("rie.dialogue.say", text=f"Let me play the following note for you. {note}.")
+        yield session.call("rom.optional.behavior.play", name="BlocklyArmsForward")
+        yield sleep(1)
+        yield session.call("rom.actuator.audio.stream", url=game.SCRIPT.notes[note], sync=False)
+        yield sleep(1)
+
+
+@inlineCallbacks
+def sequential_correct_answer(session, sleep):
+    yield session.call("rom.actuator.audio.stream", url=game.SCRIPT.sounds["success"], sync=False)
+    yield session.call("rom.optional.behavior.play", name="BlocklyApplause")
+    yield session.call("rie.dialogue.say", text="Good job you guessed the note! You get one point.")
+
+
+@inlineCallbacks
+def sequential_incorrect_answer(session, sleep, random_note):
+    yield session.call("rom.actuator.audio.stream", url=game.SCRIPT.sounds["fail"], sync=False)
+    yield session.call("rom.optional.behavior.play", name="BlocklyShrug")
+    yield sleep(1)
+    yield session.call("rie.dialogue.say", text=f"Sorry, but I don't think that was the answer. I played the: {random_note} note. Here is what the {random_note} note sounds like, please remember it for next time")
+    yield session.call("rom.actuator.audio.stream", url=game.SCRIPT.notes[random_note], sync=False)
+    yield sleep(2)
+
+
+def measure(step):
+    """
+    Runs a game step on a virtual clock, returns the simulated seconds it took.
+    """
+    clock = task.Clock()
+    session = InProcessSession(SimulatedRobot("bench", latency=ROBOT_LATENCY, clock=clock))
+    run_on_clock(clock, step(session, lambda seconds: task.deferLater(clock, seconds, lambda: None)))
+    return clock.seconds()
+
+
+def main():
+    wrong_guess = game.GameState()
+    wrong_guess.current_note = "A"
+    steps = [
+        ("play_and_showcase_notes", sequential_play_and_showcase_notes,
+         lambda session, sleep: game.play_and_showcase_notes(session)),
+        ("correct_answer", sequential_correct_answer,
+         lambda session, sleep: game.correct_answer(session)),
+        ("incorrect_answer", lambda session, sleep: sequential_incorrect_answer(session, sleep, "A"),
+         lambda session, sleep: game.incorrect_answer(session, wrong_guess)),
+    ]
+    print(f"{'step':<25}{'sequential (s)':>16}{'action plan (s)':>17}{'speedup':>9}")
+    for name, sequential, planned in steps:
+        before = measure(sequential)
+        after = measure(planned)
+        print(f"{name:<25}{before:>16.2f}{after:>17.2f}{before / after:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
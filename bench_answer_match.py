@@ -0,0 +1,110 @@
+"""
+Description: Benchmark of answer recognition on the streaming transcript against waiting for rie.dialogue.ask.
+             Replays transcripts (every partial transcript with its time since the question ended)
+             through the answers of the game script. rie.dialogue.ask answers when the transcript is
+             final, the stream answers at the first partial transcript that matches one answer.
+             Reports, per kind of question, the mean time to the answer both ways, how often the
+             early answer was right and the time spent matching one partial transcript.
+             Without --transcripts, the answers in UTTERANCES are said with the speech timings of
+             the simulated robot. Recorded transcripts can be given as a JSON file:
+                 [{"answers": "notes", "expected": "C", "frames": [[1.4, "I", false], ..., [3.9, "I think it is C", true]]}]
+             Run it with: python bench_answer_match.py [--transcripts transcripts.json]
+"""
+
+import argparse
+import json
+import statistics
+import time
+from collections import defaultdict
+
+from game_script import load_script
+from simulated_robot import STT_REACTION_SECONDS, STT_WORD_SECONDS, STT_ENDPOINT_SECONDS
+
+# (answers, what the player says, the right answer)
+UTTERANCES = [
+    ("yes_no", "yes", "Yes"),
+    ("yes_no", "yes I am ready", "Yes"),
+    ("yes_no", "uhm yes", "Yes"),
+    ("yes_no", "ja hoor", "Yes"),
+    ("yes_no", "no", "No"),
+    ("yes_no", "no thank you", "No"),
+    ("yes_no", "nee", "No"),
+    ("yes_no", "nay not now", "No"),
+    ("yes_no", "now yes", "Yes"),
+    ("yes_no", "now let me think yes", "Yes"),
+    ("notes", "C", "C"),
+    ("notes", "see", "C"),
+    ("notes", "I think it is D", "D"),
+    ("notes", "dee I think", "D"),
+    ("notes", "it is a G", "G"),
+    ("notes", "gee", "G"),
+    ("notes", "uhm E", "E"),
+    ("notes", "E please", "E"),
+    ("notes", "A", "A"),
+    ("notes", "it was an A", "A"),
+    ("notes", "let me see it is D", "D"),
+    ("notes", "let me see uhm G", "G"),
+    ("notes", "eh A", "A"),
+    ("notes", "I don't know", None),
+]
+
+
+def said(text):
+    """
+    The transcript frames [(seconds, text, final)] of text said with the timings of the simulated robot.
+    """
+    words = text.split()
+    at = STT_REACTION_SECONDS
+    frames = []
+    for count in range(1, len(words) + 1):
+        at += STT_WORD_SECONDS
+        frames.append((at, " ".join(words[:count]), False))
+    frames.append((at + STT_ENDPOINT_SECONDS, text, True))
+    return frames
+
+
+def replay(index, frames):
+    """
+    Returns (answer, seconds) of the stream, (answer, seconds) of ask and the seconds spent matching per frame.
+    """
+    streamed = None
+    matching = []
+    for at, text, final in frames:
+        start = time.perf_counter()
+        answer = index.match(text, final)
+        matching.append(time.perf_counter() - start)
+        if streamed is None and (answer is not None or final):
+            streamed = (answer, at)
+    at, text, final = frames[-1]
+    return streamed, (index.match(text, final=True), at), matching
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1].strip())
+    parser.add_argument("--transcripts", help="JSON file with recorded transcripts")
+    args = parser.parse_args()
+
+    if args.transcripts:
+        with open(args.transcripts) as f:
+            transcripts = [(entry["answers"], entry["expected"], entry["frames"]) for entry in json.load(f)]
+    else:
+        transcripts = [(answers, expected, said(text)) for answers, text, expected in UTTERANCES]
+
+    script = load_script()
+    results = defaultdict(list)  # answers -> (stream seconds, ask seconds, stream right, ask right)
+    matching = []
+    for answers, expected, frames in transcripts:
+        (stream_answer, stream_at), (ask_answer, ask_at), seconds = replay(script.answer_index(answers), frames)
+        results[answers].append((stream_at, ask_at, stream_answer == expected, ask_answer == expected))
+        matching += seconds
+
+    print(f"{'answers':<10}{'questions':>10}{'ask (s)':>9}{'stream (s)':>12}{'saved (s)':>11}{'ask right':>11}{'stream right':>14}")
+    for answers, rows in results.items():
+        stream, ask, stream_right, ask_right = zip(*rows)
+        print(f"{answers:<10}{len(rows):>10}{statistics.mean(ask):>9.2f}{statistics.mean(stream):>12.2f}"
+              f"{statistics.mean(ask) - statistics.mean(stream):>11.2f}{sum(ask_right):>11}{sum(stream_right):>14}")
+    print(f"matching a partial transcript: {statistics.median(matching) * 1e6:.0f} us median, {max(matching) * 1e6:.0f} us max")
+
+
+if __name__ == "__main__":
+    main()
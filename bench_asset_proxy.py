@@ -0,0 +1,146 @@
+"""
+Description: Check and benchmark of the asset proxy against a local stand-in origin.
+             The origin (on a free port) serves FILES audio files after ORIGIN_DELAY seconds, like a remote
+             host, with validators in the case some servers use ("Etag", "last-modified"). The proxy
+             (max_bytes smaller than all the files) prefetches them, then the checks are:
+             every cached file is served with the bytes of the origin, the least recently used file
+             was evicted to stay under max_bytes (and its url is the original one again), and a
+             restarted proxy revalidates its cached files with 304 Not Modified instead of
+             downloading them again, and warm() of stale and missing files only waits for the local
+             reads, not for the origin. Reports the time to get a file from the origin and from the proxy.
+             Exits with 1 when a check fails.
+             Run it with: python bench_asset_proxy.py
+"""
+
+import hashlib
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from twisted.internet.defer import DeferredList, inlineCallbacks
+from twisted.internet.task import react
+from twisted.internet.threads import deferToThread
+
+from asset_proxy import AssetProxy
+
+FILES = 4
+FILE_BYTES = 100 * 1024
+MAX_BYTES = 3 * FILE_BYTES + FILE_BYTES // 2  # Room for three files, so one is evicted
+ORIGIN_DELAY = 0.1  # Seconds the origin takes to answer, like a remote host
+GETS = 10
+
+
+class _Origin(BaseHTTPRequestHandler):
+    files = {}  # path -> body
+    statuses = []  # Status of every answered request
+
+    def do_GET(self):
+        time.sleep(ORIGIN_DELAY)
+        body = self.files.get(self.path)
+        if body is None:
+            self._answer(404)
+            return
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self._answer(304, etag)
+            return
+        self._answer(200, etag, body)
+
+    def _answer(self, status, etag=None, body=b""):
+        self.statuses.append(status)
+        self.send_response(status)
+        if etag:
+            self.send_header("Etag", etag)  # Not "ETag", the proxy has to look validators up case-insensitively
+            self.send_header("last-modified", formatdate(0, usegmt=True))
+        if status == 200:
+            self.send_header("Content-Type", "audio/wav")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def get(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return response.read()
+
+
+@inlineCallbacks
+def timed_gets(url):
+    """
+    Median seconds of GETS downloads of url (in a thread, the proxy runs on the reactor).
+    """
+    seconds = []
+    for _ in range(GETS):
+        start = time.perf_counter()
+        yield deferToThread(get, url)
+        seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds)
+
+
+@inlineCallbacks
+def main(reactor):
+    origin = ThreadingHTTPServer(("127.0.0.1", 0), _Origin)
+    threading.Thread(target=origin.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{origin.server_address[1]}"
+    _Origin.files = {f"/note{i}.wav": bytes([i]) * FILE_BYTES for i in range(FILES)}
+    urls = [base + path for path in _Origin.files]
+    failed = []
+
+    def check(ok, what):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failed.append(what)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        proxy = AssetProxy(urls, cache_dir=cache_dir, max_bytes=MAX_BYTES, port=0, host="127.0.0.1")
+        start = time.perf_counter()
+        yield proxy.start()
+        prefetch_seconds = time.perf_counter() - start
+        check(_Origin.statuses == [200] * FILES, f"prefetch downloaded all {FILES} files once")
+
+        # The downloads run concurrently, the one that was stored first is the least recently used one
+        evicted = [url for url in urls if proxy.url(url) == url]
+        cached = [url for url in urls if url not in evicted]
+        check(proxy.cache.total_bytes <= MAX_BYTES, f"cache holds {proxy.cache.total_bytes} bytes, at most max_bytes {MAX_BYTES}")
+        check(len(evicted) == 1, "the least recently used file was evicted, its url is the original url")
+        for url in cached:
+            served = yield deferToThread(get, proxy.url(url))
+            check(proxy.url(url) != url and served == _Origin.files[url[len(base):]], f"{url[len(base):]} served from the proxy with the bytes of the origin")
+
+        origin_seconds = yield timed_gets(cached[0])
+        proxy_seconds = yield timed_gets(proxy.url(cached[0]))
+        yield proxy.stop()
+
+        del _Origin.statuses[:]
+        restarted = AssetProxy(cached, cache_dir=cache_dir, max_bytes=MAX_BYTES, port=0, host="127.0.0.1", max_age=0)
+        yield restarted.start()
+        check(_Origin.statuses == [304] * len(cached), f"restart revalidated the cached files with 304 Not Modified (got {_Origin.statuses})")
+        for url in cached:
+            served = yield deferToThread(get, restarted.url(url))
+            check(served == _Origin.files[url[len(base):]], f"{url[len(base):]} still served after the restart")
+
+        # max_age 0: all the cached files are stale, the evicted one is missing
+        start = time.perf_counter()
+        yield restarted.warm(urls)
+        warm_seconds = time.perf_counter() - start
+        check(warm_seconds < ORIGIN_DELAY, f"warm of stale and missing files took {warm_seconds * 1000:.1f} ms, less than the origin delay")
+        yield DeferredList([restarted.refresh(url) for url in urls])  # The refreshes warm started in the background
+        yield restarted.stop()
+
+    origin.shutdown()
+    print(f"prefetch of {FILES} files: {prefetch_seconds:.2f} s")
+    print(f"GET of a file: {origin_seconds * 1000:.1f} ms from the origin, {proxy_seconds * 1000:.1f} ms from the proxy (median of {GETS})")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    react(main)
@@ -0,0 +1,58 @@
+"""
+Description: Benchmark of sending a clip to rom.actuator.audio.play, whole float32 array vs chunked 16 bit PCM.
+             Serializes the calls with the msgpack serializer of the WAMP transport and reports
+             the bytes on the wire, the peak memory used while serializing and the time to first
+             sound: the time until the first (or only) message has been serialized and sent over
+             a link of LINK_BYTES_PER_SECOND.
+             Run it with: python bench_audio_transport.py
+"""
+
+import time
+import tracemalloc
+
+import numpy as np
+import txaio
+txaio.use_twisted()  # Has to be chosen before the serializer module is imported
+from autobahn.wamp import message
+from autobahn.wamp.serializer import MsgPackSerializer
+
+import guitar_synth
+from audio_transport import PcmChunker, CHUNK_SECONDS
+from note_audio import ROBOT_SAMPLE_RATE
+
+LINK_BYTES_PER_SECOND = 1_000_000  # WiFi to the robot in a busy classroom
+RPC_LATENCY = 0.03
+
+
+def measure(payloads):
+    """
+    Serializes a call for every payload, returns (total bytes, peak bytes allocated, seconds to first sound).
+    """
+    serializer = MsgPackSerializer()
+    tracemalloc.start()
+    total, first = 0, None
+    start = time.perf_counter()
+    for request, data in enumerate(payloads):
+        call = message.Call(request, "rom.actuator.audio.play", kwargs={"data": data, "rate": ROBOT_SAMPLE_RATE, "sync": True})
+        size = len(serializer.serialize(call)[0])
+        total += size
+        if first is None:
+            first = time.perf_counter() - start + RPC_LATENCY + size / LINK_BYTES_PER_SECOND
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return total, peak, first
+
+
+def main():
+    print(f"{'clip':<8}{'transport':<20}{'wire (kB)':>10}{'peak (kB)':>10}{'first sound (ms)':>18}")
+    for seconds in [1.5, 5, 20]:
+        clip = np.ascontiguousarray(np.tile(guitar_synth.render(("A",)), int(np.ceil(seconds / 1.5)))[:int(seconds * ROBOT_SAMPLE_RATE)])
+        chunker = PcmChunker(int(CHUNK_SECONDS * ROBOT_SAMPLE_RATE))
+        for name, payloads in [("float32, one call", [memoryview(clip).cast("B")]),
+                               ("int16 PCM, chunked", chunker.chunks(clip))]:
+            total, peak, first = measure(payloads)
+            print(f"{seconds:<8}{name:<20}{total / 1000:>10.0f}{peak / 1000:>10.0f}{first * 1000:>18.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Description: Benchmark of the streaming pitch detection on synthesized guitar notes.
+             Feeds every note as 16 bit PCM frames (like the robot microphone sends them)
+             into a PitchDetector and reports the detected note, how much audio it needed
+             before the answer was stable and the processing time per frame compared to the
+             duration of a frame. Then every note is fed again under tracemalloc, to check that
+             push() allocates no arrays (the peak per frame stays under MAX_PUSH_BYTES, only the
+             small Python objects of the NumPy calls). Exits with 1 when it does.
+             Run it with: python bench_pitch_detect.py
+"""
+
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import guitar_synth
+from pitch_detect import PitchDetector
+
+FRAME = 256  # Samples per microphone frame (16 ms at 16 kHz)
+MAX_PUSH_BYTES = 16 * 1024  # Peak Python allocation of one push(), a single work array of the detector is bigger
+
+
+def main():
+    detector = PitchDetector()
+    frame_period = FRAME / detector.rate
+    print(f"{'note':<6}{'detected':>9}{'after (ms)':>12}{'per frame (us)':>16}{'of period':>11}{'peak alloc (B)':>16}")
+    peak = 0
+    for note in ["E2", "A2", "C3", "D3", "E3", "G3", "A3", "C4"]:
+        samples = (guitar_synth.render((note,)) * 32767).astype(np.int16)
+        frames = [samples[start:start + FRAME].tobytes() for start in range(0, len(samples) - FRAME, FRAME)]
+        detector.reset()
+        detected, after, times = None, None, []
+        for number, frame in enumerate(frames):
+            begin = time.perf_counter()
+            found = detector.push(frame)
+            times.append(time.perf_counter() - begin)
+            if found is not None and detected is None:
+                detected, after = found, (number + 1) * FRAME / detector.rate
+        per_frame = np.median(times)
+
+        # Again under tracemalloc (it slows the calls down, so not while timing)
+        detector.reset()
+        note_peak = 0
+        tracemalloc.start()
+        for frame in frames:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            detector.push(frame)
+            note_peak = max(note_peak, tracemalloc.get_traced_memory()[1] - before)
+        tracemalloc.stop()
+        peak = max(peak, note_peak)
+        print(f"{note:<6}{str(detected):>9}{(after or 0) * 1000:>12.0f}{per_frame * 1e6:>16.1f}{per_frame / frame_period:>10.2%}{note_peak:>16}")
+
+    ok = peak <= MAX_PUSH_BYTES
+    print(f"{'ok  ' if ok else 'FAIL'} push() allocated at most {peak} bytes per frame (limit {MAX_PUSH_BYTES})")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
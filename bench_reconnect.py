@@ -0,0 +1,128 @@
+"""
+Description: Reconnect benchmark: how fast the game recovers when the connection to the robot drops.
+             Plays the game against a SimulatedRouter (timings of a real robot, TIME_SCALE times faster)
+             and kills the router when the note of round --kill-round is played, then restarts it on
+             the same port --down seconds later. The game reconnects with the backoff of
+             reconnect.transport and resumes from its checkpoint. Reports the time until the drop was
+             noticed, from the restart until the game joined again and until the robot got its next
+             call (the game resumed), and the whole outage, the median of --runs runs.
+             With --hang the router does not close the connections but stops answering, like a dead
+             link, so only the keepalive pings notice the drop.
+             Every run is checked against the same game without a drop: the same notes, the same score,
+             and only the round that was cut off is played again.
+             Run it with: python bench_reconnect.py [--runs 5] [--kill-round 3] [--down 1.0] [--hang]
+"""
+
+import argparse
+import io
+import statistics
+import time
+from contextlib import redirect_stdout
+
+from autobahn.twisted.component import Component
+from twisted.internet.defer import inlineCallbacks
+from twisted.internet.task import react
+
+import SRP_Final_Assignment_Joris_Postmus_Group11 as game
+from reconnect import CheckpointStore, transport
+from simulated_robot import SimulatedRobot, SimulatedRouter, ROBOT_LATENCY
+
+REALM = "rie.bench"
+SEED = 7
+ANSWERS = ["Yes", "C", "D", "E", "G", "A", "No"]  # Ready, the five rounds, do not play again
+TIME_SCALE = 0.05
+
+
+class _Robot(SimulatedRobot):
+    """
+    Simulated robot that tells the benchmark about every call it gets.
+    """
+
+    def __init__(self, realm, on_call):
+        super().__init__(realm, scripted_answers=ANSWERS, latency=ROBOT_LATENCY, time_scale=TIME_SCALE, seed=SEED)
+        self.on_call = on_call
+
+    def call(self, procedure, kwargs):
+        self.on_call(procedure)
+        return super().call(procedure, kwargs)
+
+
+@inlineCallbacks
+def play(reactor, kill_round=None, down=1.0, hang=False):
+    """
+    Plays one game, the router is killed in round kill_round (None: never).
+    Returns (GameState at the end, questions asked, times {event: perf_counter seconds}).
+    """
+    times = {}
+    states = []
+    asked = []
+    robots = []
+
+    def on_call(procedure):
+        now = time.perf_counter()
+        if procedure == "rie.dialogue.ask":
+            asked.append(procedure)
+        if "restarted" in times:
+            times.setdefault("resumed", now)
+        state = states[-1]
+        if (kill_round is not None and "killed" not in times and state.playing_rounds
+                and state.round == kill_round - 1 and procedure == "rom.actuator.audio.stream"):
+            times["killed"] = now
+            reactor.callLater(0, router.stop, hang)
+            reactor.callLater(down, restart)
+
+    def restart():
+        router.listen(port)
+        times["restarted"] = time.perf_counter()
+
+    def on_join(session, details):
+        if "killed" in times:
+            times.setdefault("joined", time.perf_counter())
+        state = game.resume_state(details.realm, seed=SEED)  # Every game picks the same notes
+        states.append(state)
+        return game.main(session, state)
+
+    def on_leave(session, details):
+        if "killed" in times:
+            times.setdefault("lost", time.perf_counter())
+
+    router = SimulatedRouter(lambda realm: robots.append(_Robot(realm, on_call)) or robots[-1])
+    port = router.listen(0)
+    component = Component(transports=[transport(f"ws://127.0.0.1:{port}/ws")], realm=REALM)
+    component.on_join(on_join)
+    component.on_leave(on_leave)
+    game.checkpoints = CheckpointStore()  # In memory, nothing is written next to the game
+    with redirect_stdout(io.StringIO()):  # The game prints every note and answer
+        yield component.start(reactor)
+    yield router.stop()
+    return states[-1], len(asked), times
+
+
+@inlineCallbacks
+def main(reactor):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1].strip())
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--kill-round", type=int, default=3)
+    parser.add_argument("--down", type=float, default=1.0, help="seconds the router is down")
+    parser.add_argument("--hang", action="store_true", help="the connections hang instead of closing")
+    args = parser.parse_args()
+
+    expected, expected_asked, _ = yield play(reactor)
+    print(f"without a drop: notes {' '.join(expected.planned_notes)}, score {expected.correct_answers}, {expected_asked} questions")
+
+    results = []
+    for run in range(args.runs):
+        state, asked, times = yield play(reactor, args.kill_round, args.down, args.hang)
+        same = state.planned_notes == expected.planned_notes and state.correct_answers == expected.correct_answers
+        print(f"run {run + 1}: notes {' '.join(state.planned_notes)}, score {state.correct_answers}, "
+              f"{asked - expected_asked} questions asked again, {'same game' if same else 'DIFFERENT GAME'}")
+        results.append((times["lost"] - times["killed"], times["joined"] - times["restarted"],
+                        times["resumed"] - times["restarted"], times["resumed"] - times["killed"]))
+
+    noticed, joined, resumed, outage = (statistics.median(column) for column in zip(*results))
+    print(f"{'drop noticed (s)':>17}{'joined (s)':>12}{'resumed (s)':>13}{'outage (s)':>12}   (router down {args.down} s, median of {args.runs})")
+    print(f"{noticed:>17.2f}{joined:>12.2f}{resumed:>13.2f}{outage:>12.2f}")
+
+
+if __name__ == "__main__":
+    react(main)
@@ -0,0 +1,86 @@
+"""
+Description: Latency benchmark of the game against the simulated robot.
+             Runs the phases of the game (game_intro, play_and_showcase_notes, main_loop, play_again)
+             and then main as a whole against a SimulatedRobot with the timings of a real robot
+             (ROBOT_LATENCY, varied by --jitter) on a virtual clock, so the phase times are robot
+             seconds that do not depend on how busy this machine is. The time spent in the code of the
+             game itself (the wall clock time of the run, nothing really waits) is reported on its own.
+             Reports the time per phase, the code path time, rounds per second and the number of calls per round.
+             Run it with: python bench_session.py [--jitter 0.1] [--seed 1]
+"""
+
+import argparse
+import io
+import time
+from contextlib import redirect_stdout
+
+from twisted.internet import task
+
+import SRP_Final_Assignment_Joris_Postmus_Group11 as game
+from simulated_robot import InProcessSession, SimulatedRobot, ROBOT_LATENCY, run_on_clock
+
+REALM = "rie.benchmark"
+
+
+class PhaseTimer:
+    """
+    Measures the robot time, the code path time and the number of robot calls of every phase.
+    """
+
+    def __init__(self, robot, clock):
+        self.robot = robot
+        self.clock = clock
+        self.phases = []  # (name, robot seconds, code path seconds, calls)
+
+    def measure(self, name, phase, *args):
+        calls = len(self.robot.calls)
+        start, code_start = self.clock.seconds(), time.perf_counter()
+        result = run_on_clock(self.clock, phase(*args))
+        code = time.perf_counter() - code_start
+        self.phases.append((name, self.clock.seconds() - start, code, len(self.robot.calls) - calls))
+        return result
+
+    def report(self):
+        print(f"{'phase':<25}{'time (s)':>10}{'code path (ms)':>16}{'calls':>8}")
+        for name, elapsed, code, calls in self.phases:
+            print(f"{name:<25}{elapsed:>10.2f}{code * 1000:>16.2f}{calls:>8}")
+        for name, elapsed, code, calls in self.phases:
+            if name == "main_loop":
+                rounds = game.SCRIPT.rounds
+                print(f"rounds per second: {rounds / elapsed:.3f} ({elapsed / rounds:.2f} s per round)")
+                print(f"calls per round: {calls / rounds:.1f}")
+                print(f"code path per call: {code / calls * 1e6:.0f} us")
+
+
+def benchmark(jitter, seed):
+    clock = task.Clock()
+    robot = SimulatedRobot(REALM, latency=ROBOT_LATENCY, jitter=jitter, seed=seed, clock=clock)
+    session = InProcessSession(robot)
+    timer = PhaseTimer(robot, clock)
+    state = game.GameState(REALM, seed=seed)
+    rounds = game.SCRIPT.rounds
+
+    with redirect_stdout(io.StringIO()):  # Keep the prints of the game out of the report
+        robot.scripted_answers = ["Yes"]
+        timer.measure("game_intro", game.game_intro, session, state)
+        timer.measure("play_and_showcase_notes", game.play_and_showcase_notes, session, state)
+        robot.scripted_answers = ["X"] * rounds  # Never the right note, the slowest path through a round
+        timer.measure("main_loop", game.main_loop, session, state)
+        robot.scripted_answers = ["No"]
+        timer.measure("play_again", game.play_again, session, state)
+
+        robot.scripted_answers = ["Yes"] + ["X"] * rounds + ["No"]
+        timer.measure("main (everything)", game.main, session, game.GameState(REALM, seed=seed))
+    timer.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1].strip())
+    parser.add_argument("--jitter", type=float, default=0.1, help="random variation of the robot timings (default 0.1)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    benchmark(args.jitter, args.seed)
+
+
+if __name__ == "__main__":
+    main()
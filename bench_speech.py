@@ -0,0 +1,57 @@
+"""
+Description: Benchmark of pipelined speech (speech.say) against saying a text in one rie.dialogue.say call.
+             Says the long texts of the game to a simulated robot on a virtual clock, in three ways:
+             the whole text in one call, the chunks one call after the other, and the chunks
+             pipelined. Reports the time to the first word, the dead air between the chunks
+             (the robot is silent while the next chunk is sent and synthesized) and the total time.
+             Run it with: python bench_speech.py
+"""
+
+from twisted.internet import task
+from twisted.internet.defer import inlineCallbacks
+
+import speech
+from game_script import load_script
+from simulated_robot import InProcessSession, SimulatedRobot, ROBOT_LATENCY, run_on_clock
+
+
+def whole(session, chunks):
+    return session.call("rie.dialogue.say", text=" ".join(chunks))
+
+
+@inlineCallbacks
+def one_by_one(session, chunks):
+    for chunk in chunks:
+        yield session.call("rie.dialogue.say", text=chunk)
+
+
+def measure(way, chunks):
+    """
+    Says chunks on a virtual clock, returns (seconds to the first word, seconds of dead air, total seconds).
+    """
+    clock = task.Clock()
+    session = InProcessSession(SimulatedRobot("bench", latency=ROBOT_LATENCY, clock=clock))
+    run_on_clock(clock, way(session, chunks))
+    spoken = session.robot.speech
+    dead_air = sum(max(0.0, start - end) for (_, end), (start, _) in zip(spoken, spoken[1:]))
+    return spoken[0][0], dead_air, clock.seconds()
+
+
+def main():
+    script = load_script()
+    texts = [
+        ("intro", script.say_chunks("look")),
+        ("welcome + mode", script.say_chunks("welcome") + script.say_chunks("mode")),
+        ("incorrect answer", script.say_chunks("incorrect", note="A")),
+        ("good score", script.say_chunks("good_score", score=4)),
+    ]
+    ways = [("one call", whole), ("chunk by chunk", one_by_one), ("pipelined", speech.say)]
+    print(f"{'text':<18}{'chunks':>7}  {'way':<16}{'first word (s)':>15}{'dead air (s)':>14}{'total (s)':>11}")
+    for name, chunks in texts:
+        for way_name, way in ways:
+            first_word, dead_air, total = measure(way, chunks)
+            print(f"{name:<18}{len(chunks):>7}  {way_name:<16}{first_word:>15.2f}{dead_air:>14.2f}{total:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Description: Startup benchmark: time from process start to the first word the robot says.
+             Starts a SimulatedRouter with the timings of a real robot (ROBOT_LATENCY), then starts
+             the game as a new Python process pointed at the router, like running the script,
+             and stops it as soon as the robot is asked to say (or ask) something. Reports the
+             time to import the game, to join the realm and to the first spoken word, the median
+             of --runs runs, for both programs. The game processes run in a temporary directory,
+             so caches, traces and recordings do not end up in the repository.
+             Run it with: python bench_startup.py [--runs 5]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from twisted.internet import protocol
+from twisted.internet.defer import Deferred, inlineCallbacks
+from twisted.internet.task import react
+
+from simulated_robot import SimulatedRobot, SimulatedRouter, ROBOT_LATENCY
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SPEECH = ("rie.dialogue.say", "rie.dialogue.ask")
+
+# Runs a game like its __main__ does, but against the router at sys.argv[2]
+GAME = """
+import importlib, sys, time
+from autobahn.twisted.component import Component, run
+game = importlib.import_module(sys.argv[1])
+print("imported", time.time(), flush=True)
+component = Component(transports=[{"url": sys.argv[2], "serializers": ["msgpack"], "max_retries": 0}], realm=sys.argv[3])
+if hasattr(game, "GameState"):
+    component.on_join(lambda session, details: game.main(session, game.GameState(details.realm)))
+    game.assets.start()
+else:
+    component.on_join(game.main)
+run([component], log_level=None)
+"""
+PROGRAMS = ["SRP_Final_Assignment_Joris_Postmus_Group11", "project-code-group11"]
+
+
+class _Game(protocol.ProcessProtocol):
+    def __init__(self):
+        self.imported = None
+        self.ended = Deferred()
+        self._output = b""
+
+    def outReceived(self, data):
+        self._output += data
+        *lines, self._output = self._output.split(b"\n")
+        for line in lines:
+            if line.startswith(b"imported "):
+                self.imported = float(line.split()[1])
+
+    def processEnded(self, reason):
+        self.ended.callback(None)
+
+
+class FirstWord:
+    """
+    Robot factory of the router that notes when the game joined and when it first made the robot talk.
+    """
+
+    def __init__(self):
+        self.joined = None
+        self.spoken = Deferred()
+
+    def __call__(self, realm):
+        self.joined = time.time()
+        robot = SimulatedRobot(realm, latency=ROBOT_LATENCY)
+        call = robot.call
+
+        def noting_call(procedure, kwargs):
+            if procedure in SPEECH and not self.spoken.called:
+                self.spoken.callback(time.time())
+            return call(procedure, kwargs)
+
+        robot.call = noting_call
+        return robot
+
+
+@inlineCallbacks
+def measure(reactor, program, directory):
+    """
+    Starts program once, returns (seconds to import, to join, to the first word) since the process was started.
+    """
+    first_word = FirstWord()
+    router = SimulatedRouter(first_word)
+    port = router.listen(0)
+    game = _Game()
+    env = dict(os.environ, PYTHONPATH=HERE)
+    start = time.time()
+    process = reactor.spawnProcess(game, sys.executable, [sys.executable, "-c", GAME, program, f"ws://127.0.0.1:{port}/ws", "rie.startup"],
+                                   env=env, path=directory)
+    spoken = yield first_word.spoken
+    process.signalProcess("KILL")
+    yield game.ended
+    yield router.stop()
+    return game.imported - start, first_word.joined - start, spoken - start
+
+
+@inlineCallbacks
+def main(reactor, args):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1].strip())
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(args)
+
+    print(f"{'program':<45}{'import (s)':>11}{'joined (s)':>11}{'first word (s)':>15}")
+    with tempfile.TemporaryDirectory() as directory:
+        for program in PROGRAMS:
+            runs = []
+            for _ in range(args.runs):
+                runs.append((yield measure(reactor, program, directory)))
+            imported, joined, spoken = (statistics.median(values) for values in zip(*runs))
+            print(f"{program:<45}{imported:>11.3f}{joined:>11.3f}{spoken:>15.3f}")
+
+
+if __name__ == "__main__":
+    react(main, (sys.argv[1:],))
@@ -0,0 +1,139 @@
+"""
+Description: Declarative script of the guitar note game, loaded from a JSON file (game_script.json).
+             The script holds what used to be written into the game code: the note set and its
+             audio files, the difficulty levels (number of rounds and notes), the texts the robot
+             says, the behaviors it plays, the accepted answers and the flow of the game.
+             The flow is a small state machine: every step runs one phase of the game and the
+             answer of that phase picks the next step ("otherwise" for all other answers, null
+             ends the game). plan_rounds picks the notes of all the rounds up front, so the assets
+             of the next round can be prepared while the current round is played.
+
+Example:
+    script = load_script("game_script.json", difficulty="quick")
+    yield run_script(session, state, {"game_intro": game_intro, ...})
+"""
+
+import json
+import os
+
+from twisted.internet.defer import inlineCallbacks
+
+from answer_match import AnswerIndex
+from speech import split_utterance
+
+DEFAULT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "game_script.json")
+OTHERWISE = "otherwise"  # Next step for the answers that are not listed
+
+
+class GameScript:
+    """
+    A loaded game script, at one difficulty level.
+    """
+
+    def __init__(self, config, difficulty=None):
+        self.notes = config["notes"]  # note -> url of its audio file
+        self.sounds = config["sounds"]  # name -> url
+        self.behaviors = config["behaviors"]  # name -> behavior of the robot
+        self.answers = config["answers"]  # name -> {answer: [accepted words]}
+        self.prompts = config["prompts"]
+        self.difficulty = difficulty or config["difficulty"]
+        if self.difficulty not in config["difficulties"]:
+            raise ValueError(f"Unknown difficulty {self.difficulty!r}, the script has: {', '.join(config['difficulties'])}")
+        level = config["difficulties"][self.difficulty]
+        self.mode = level.get("name", self.difficulty)
+        self.rounds = level["rounds"]
+        self.note_set = level.get("notes", list(self.notes))
+        self.start = config["flow"]["start"]
+        self.steps = config["flow"]["steps"]
+        self._check()
+        self._ask_answers = dict(self.answers, notes={note: self.answers["notes"][note] for note in self.note_set})
+        self._indexes = {}
+        self._chunks = {}  # (prompt, fields) -> chunks of the text
+
+    def _check(self):
+        for note in self.note_set:
+            if note not in self.notes:
+                raise ValueError(f"Note {note} of difficulty {self.difficulty} has no audio file")
+            if note not in self.answers["notes"]:
+                raise ValueError(f"Note {note} of difficulty {self.difficulty} has no answers")
+        for name, step in [(None, {"next": self.start}), *self.steps.items()]:
+            targets = step["next"].values() if isinstance(step["next"], dict) else [step["next"]]
+            for target in targets:
+                if target is not None and target not in self.steps:
+                    raise ValueError(f"Step {name or 'start'} goes to {target}, which is not a step")
+
+    def say(self, prompt, **fields):
+        """
+        Text of a prompt, {rounds} and {mode} are always filled in.
+        """
+        return self.prompts[prompt].format(rounds=self.rounds, mode=self.mode, **fields)
+
+    def say_chunks(self, prompt, **fields):
+        """
+        Text of a prompt split into chunks for speech.say. The prompt is split once and every filled in text is kept.
+        """
+        key = (prompt, tuple(sorted(fields.items())))
+        if key not in self._chunks:
+            self._chunks[key] = tuple(chunk.format(rounds=self.rounds, mode=self.mode, **fields)
+                                      for chunk in split_utterance(self.prompts[prompt]))
+        return self._chunks[key]
+
+    def ask_answers(self, name):
+        """
+        The answers dict of rie.dialogue.ask for "yes_no" or "notes" (the notes of this difficulty), built once.
+        """
+        return self._ask_answers[name]
+
+    def answer_index(self, name):
+        """
+        The answers of ask_answers(name) compiled for matching transcripts, compiled the first time they are needed.
+        """
+        if name not in self._indexes:
+            self._indexes[name] = AnswerIndex(self._ask_answers[name])
+        return self._indexes[name]
+
+    def asset_urls(self):
+        return [*self.notes.values(), *self.sounds.values()]
+
+    def round_urls(self, note):
+        """
+        The audio files a round with this note can need (the note and the sound of either outcome).
+        """
+        return [self.notes[note], *self.sounds.values()]
+
+    def plan_rounds(self, rng):
+        """
+        The notes of all the rounds, picked with rng (a random.Random).
+        """
+        return [rng.choice(self.note_set) for _ in range(self.rounds)]
+
+    def next_step(self, step, answer):
+        following = self.steps[step]["next"]
+        if isinstance(following, dict):
+            return following.get(answer, following.get(OTHERWISE))
+        return following
+
+
+def load_script(path=DEFAULT_SCRIPT, difficulty=None):
+    with open(path) as f:
+        return GameScript(json.load(f), difficulty)
+
+
+@inlineCallbacks
+def run_script(session, state, phases, on_step=None):
+    """
+    Runs the flow of state.script from state.step (the start step when None) until it ends.
+    phases maps the phase names of the script to functions (session, state) that return a Deferred of their answer.
+    on_step(state) is called before every step runs (e.g. to checkpoint the game).
+    """
+    script = state.script
+    unknown = {step["phase"] for step in script.steps.values()} - set(phases)
+    if unknown:
+        raise ValueError(f"The script uses unknown phases: {', '.join(sorted(unknown))}")
+    if state.step is None:
+        state.step = script.start
+    while state.step is not None:
+        if on_step is not None:
+            on_step(state)
+        answer = yield phases[script.steps[state.step]["phase"]](session, state)
+        state.step = script.next_step(state.step, answer)
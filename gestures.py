@@ -0,0 +1,132 @@
+"""
+Description: Library of precompiled motor gestures for rom.actuator.motor.write.
+             A gesture is defined once as keyframes and compiled into NumPy arrays
+             (joints x time), checking at compile time that every keyframe has the same
+             joints (the robot requires this). Gestures can be resampled, time-scaled and
+             repeated with vectorized math, and the frames sent to the robot are built only
+             once per gesture, so a repeated movement is a single motor write.
+
+Example:
+    yield session.call("rom.actuator.motor.write", frames=SAD.frames, force=True, sync=True)
+"""
+
+from functools import cached_property
+
+import numpy as np
+
+
+class Gesture:
+    """
+    Compiled trajectory: keyframe times (ms) and the joint values at those times.
+    """
+
+    def __init__(self, joints, times, values):
+        self.joints = tuple(joints)
+        self.times = np.asarray(times, dtype=np.int64)  # (time,)
+        self.values = np.asarray(values, dtype=np.float64)  # (joints, time)
+        if self.values.shape != (len(self.joints), len(self.times)):
+            raise ValueError(f"Expected values of shape {(len(self.joints), len(self.times))}, got {self.values.shape}")
+        if np.any(np.diff(self.times) <= 0):
+            raise ValueError("Keyframe times have to be increasing")
+
+    @property
+    def duration(self):
+        """
+        Duration of the gesture in ms.
+        """
+        return int(self.times[-1])
+
+    @cached_property
+    def frames(self):
+        """
+        The frames for rom.actuator.motor.write, built once per gesture.
+        """
+        rows = self.values.T.tolist()
+        return [{"time": time, "data": dict(zip(self.joints, row))} for time, row in zip(self.times.tolist(), rows)]
+
+    def at(self, times):
+        """
+        Joint values (joints x len(times)) at the given times, linearly interpolated between the keyframes.
+        """
+        times = np.clip(np.asarray(times, dtype=np.float64), self.times[0], self.times[-1])
+        right = np.clip(np.searchsorted(self.times, times, side="right"), 1, len(self.times) - 1)
+        left = right - 1
+        span = self.times[right] - self.times[left]
+        weight = np.divide(times - self.times[left], span, out=np.zeros_like(times), where=span > 0)
+        return self.values[:, left] + weight * (self.values[:, right] - self.values[:, left])
+
+    def resample(self, step_ms):
+        """
+        Gesture with a keyframe every step_ms (and one at the end).
+        """
+        times = np.arange(self.times[0], self.times[-1], step_ms, dtype=np.int64)
+        times = np.append(times, self.times[-1])
+        return Gesture(self.joints, times, self.at(times))
+
+    def scaled(self, speed):
+        """
+        Gesture that is speed times faster (or slower when speed < 1).
+        """
+        times = np.round(self.times / speed).astype(np.int64)
+        return Gesture(self.joints, times, self.values)
+
+    def repeat(self, count, pause_ms=0):
+        """
+        Gesture that plays this one count times in a row, holding the last pose for pause_ms between repetitions.
+        The first keyframe has to be after 0 ms, it is reached from the last pose of the previous repetition.
+        """
+        if self.times[0] <= 0:
+            raise ValueError("A repeated gesture has to start with a movement (first keyframe after 0 ms)")
+        times, values = self.times, self.values
+        if pause_ms > 0:  # Hold the last pose until the next repetition starts
+            times = np.append(times, times[-1] + pause_ms)
+            values = np.concatenate([values, values[:, -1:]], axis=1)
+        offsets = np.repeat(np.arange(count, dtype=np.int64) * times[-1], len(times))
+        all_times = np.tile(times, count) + offsets
+        all_values = np.tile(values, count)
+        if pause_ms > 0:  # No need to hold after the last repetition
+            all_times, all_values = all_times[:-1], all_values[:, :-1]
+        return Gesture(self.joints, all_times, all_values)
+
+
+def compile_gesture(keyframes):
+    """
+    Compiles keyframes ({"time": ms, "data": {joint: value}}) into a Gesture.
+    Raises a ValueError when not all keyframes move the same joints.
+    """
+    joints = tuple(keyframes[0]["data"])
+    for frame in keyframes:
+        if set(frame["data"]) != set(joints):
+            missing = set(joints) - set(frame["data"])
+            extra = set(frame["data"]) - set(joints)
+            raise ValueError(f"Keyframe at {frame['time']} ms has different joints (missing: {sorted(missing)}, extra: {sorted(extra)})")
+    times = [frame["time"] for frame in keyframes]
+    values = [[frame["data"][joint] for frame in keyframes] for joint in joints]
+    return Gesture(joints, times, values)
+
+
+def _pose(head_pitch, right_pitch, right_roll, left_pitch, left_roll):
+    return {"body.head.pitch": head_pitch,
+            "body.arms.right.upper.pitch": right_pitch, "body.arms.right.lower.roll": right_roll,
+            "body.arms.left.upper.pitch": left_pitch, "body.arms.left.lower.roll": left_roll}
+
+
+# Both arms up, waving the lower arms while nodding
+HAPPY = compile_gesture([
+    {"time": 0, "data": _pose(0.0, -2.5, 3, -2.5, 3)},
+    {"time": 2000, "data": _pose(0.175, -2.5, 2, -2.5, 2)},
+    {"time": 3000, "data": _pose(-0.175, -2.5, -1, -2.5, -1)},
+    {"time": 4000, "data": _pose(0.175, -2.5, 3, -2.5, 3)},
+    {"time": 5000, "data": _pose(0.0, -2.5, -1, -2.5, -1)},
+])
+
+# Lower the head, sob with the arms, raise the head again (the pauses are the old sleeps between the motor writes)
+SOB = compile_gesture([
+    {"time": 500, "data": _pose(1.5, 0, 0, 0, 0)},
+    {"time": 1000, "data": _pose(1.5, 0, 0, 0, 0)},
+    {"time": 1500, "data": _pose(1.5, -1.5, 0, -1.5, 0)},
+    {"time": 2000, "data": _pose(1.5, 0, 0, 0, 0)},
+    {"time": 2500, "data": _pose(1.5, 0, 0, 0, 0)},
+    {"time": 3000, "data": _pose(0, 0, 0, 0, 0)},
+])
+SAD = SOB.repeat(3, pause_ms=500)
@@ -0,0 +1,113 @@
+"""
+Description: Offline guitar note and chord synthesizer, so the game does not need audio files.
+             Notes are plucked strings made with the Karplus-Strong algorithm, run for a whole
+             batch of pitches at once with NumPy: every step computes a block of samples for
+             all the strings together. A chord is the strings of its notes strummed one after
+             the other. Rendered sounds are kept in an LRU cache keyed by (notes, duration, rate).
+
+Example:
+    y = render(("A",))  # A single note
+    y = render(("C", "E", "G"))  # A chord
+"""
+
+import re
+from collections import OrderedDict
+
+import numpy as np
+
+from note_audio import ROBOT_SAMPLE_RATE
+
+DEFAULT_OCTAVE = 3  # "A" is A3 (220 Hz), the middle of the guitar range
+DEFAULT_DURATION = 1.5  # Seconds
+STRUM_DELAY = 0.03  # Seconds between the strings of a chord
+DECAY = 0.996  # Damping of the string per period, lower values give shorter notes
+CACHE_SIZE = 64
+
+_NOTE = re.compile(r"^([A-Ga-g])([#b]?)(-?\d)?$")
+_SEMITONES = {"C": -9, "D": -7, "E": -5, "F": -4, "G": -2, "A": 0, "B": 2}  # Relative to A
+_cache = OrderedDict()  # (notes, duration, rate) -> samples, least recently used first
+
+
+def frequency(note):
+    """
+    Frequency in Hz of a note name like "A", "C#4" or "Bb2" (the octave defaults to DEFAULT_OCTAVE).
+    """
+    match = _NOTE.match(note)
+    if match is None:
+        raise ValueError(f"Not a note: {note!r}")
+    name, accidental, octave = match.groups()
+    semitones = _SEMITONES[name.upper()] + {"#": 1, "b": -1, "": 0}[accidental]
+    octave = DEFAULT_OCTAVE if octave is None else int(octave)
+    return 440.0 * 2 ** ((semitones + 12 * (octave - 4)) / 12)
+
+
+def pluck(frequencies, duration=DEFAULT_DURATION, rate=ROBOT_SAMPLE_RATE, seed=0):
+    """
+    Plucks a string for every frequency, returns the samples as an array of (strings, samples).
+    """
+    # The averaging filter delays by half a sample, so the delay line is half a sample shorter
+    periods = np.maximum(2, np.round(rate / np.asarray(frequencies, dtype=np.float64) - 0.5)).astype(np.int64)
+    length = int(duration * rate)
+    strings = np.arange(len(periods))[:, None]
+
+    out = np.zeros((len(periods), length), dtype=np.float32)
+    noise = np.random.default_rng(seed).uniform(-1, 1, size=(len(periods), periods.max())).astype(np.float32)
+    burst = np.arange(periods.max()) < periods[:, None]  # Each string starts with one period of noise
+    out[:, :periods.max()] = np.where(burst, noise, 0)[:, :length]
+
+    # y[n] = decay * (y[n - N] + y[n - N - 1]) / 2, a block of the shortest period at a time, so
+    # every sample in the block only depends on samples of earlier blocks
+    block = int(periods.min())
+    gain = np.float32(DECAY / 2)
+    for start in range(int(periods.min()), length, block):
+        t = np.arange(start, min(start + block, length))
+        source = t[None, :] - periods[:, None]
+        ringing = gain * (out[strings, source] + out[strings, np.maximum(source - 1, 0)])
+        out[:, t] = np.where(source >= 0, ringing, out[:, t])
+    return out
+
+
+def _mix(strings, rate):
+    """
+    Strums the strings one after the other and mixes them, normalized to a peak of 0.9.
+    """
+    delay = int(STRUM_DELAY * rate)
+    mixed = np.zeros(strings.shape[1], dtype=np.float32)
+    for i, string in enumerate(strings):
+        offset = min(i * delay, len(mixed))
+        mixed[offset:] += string[:len(mixed) - offset]
+    peak = np.abs(mixed).max()
+    return mixed * np.float32(0.9 / peak) if peak > 0 else mixed
+
+
+def _store(key, samples):
+    samples.setflags(write=False)  # Cached sounds are shared, nobody should change them
+    _cache[key] = samples
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return samples
+
+
+def render(notes, duration=DEFAULT_DURATION, rate=ROBOT_SAMPLE_RATE):
+    """
+    Samples (float32) of a note or chord, given as a tuple of note names. Rendered once, then cached.
+    """
+    key = (tuple(notes), duration, rate)
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+    strings = pluck([frequency(note) for note in key[0]], duration, rate)
+    return _store(key, _mix(strings, rate))
+
+
+def render_all(notes, duration=DEFAULT_DURATION, rate=ROBOT_SAMPLE_RATE):
+    """
+    Renders a set of single notes in one batch, returns {note: samples}. The notes are cached like render does.
+    """
+    missing = [note for note in notes if ((note,), duration, rate) not in _cache]
+    if missing:
+        strings = pluck([frequency(note) for note in missing], duration, rate)
+        for note, string in zip(missing, strings):
+            _store(((note,), duration, rate), _mix(string[None, :], rate))
+    return {note: render((note,), duration, rate) for note in notes}
@@ -0,0 +1,97 @@
+"""
+Description: In-memory store for the decoded guitar note recordings.
+             Every note in the Audio directory is decoded once at startup and resampled
+             to the playback rate of the robot, so playing a note during a round no longer
+             has to decode (and resample) the .wav file again. The decoded arrays are also
+             written to an on-disk cache of .npy files, keyed by the hash and modification
+             time of the source file, which later runs memory-map instead of decoding.
+             Notes without a recording (and chords) are synthesized with guitar_synth.
+"""
+
+import hashlib
+import os
+import numpy as np
+
+ROBOT_SAMPLE_RATE = 16000  # Playback rate of the AlphaMini speaker
+NOTE_NAMES = ["A", "B", "C", "D", "E", "F", "G"]
+
+
+class NoteAudioStore:
+    """
+    Decoded note audio, loaded once and kept in memory.
+    """
+
+    def __init__(self, audio_dir="Audio", rate=ROBOT_SAMPLE_RATE, cache_dir=None):
+        self.audio_dir = audio_dir
+        self.rate = rate
+        self.cache_dir = cache_dir if cache_dir is not None else os.path.join(audio_dir, ".cache")
+        self._notes = {}
+
+    def load_all(self, notes=NOTE_NAMES, synthesize_missing=True):
+        """
+        Loads every note that has a .wav file in the audio directory, returns the loaded note names.
+        With synthesize_missing the notes without a .wav file are synthesized instead.
+        """
+        missing = []
+        for note in notes:
+            path = os.path.join(self.audio_dir, note + ".wav")
+            if os.path.exists(path):
+                self._notes[note] = self._load(path)
+            else:
+                missing.append(note)
+        if missing and synthesize_missing:
+            import guitar_synth
+            self._notes.update(guitar_synth.render_all(missing, rate=self.rate))
+        return sorted(self._notes)
+
+    def chord(self, notes):
+        """
+        Returns the (synthesized) samples of several notes played together.
+        """
+        import guitar_synth
+        return guitar_synth.render(tuple(notes), rate=self.rate)
+
+    def get(self, note):
+        """
+        Returns the decoded samples of a note, or None if there is no recording of it.
+        """
+        return self._notes.get(note)
+
+    def __contains__(self, note):
+        return note in self._notes
+
+    def _cache_path(self, path):
+        """
+        Name of the cache file for a source file: content hash + mtime + target rate.
+        """
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:16]
+        mtime = os.stat(path).st_mtime_ns
+        name = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.cache_dir, f"{name}-{digest}-{mtime}-{self.rate}.npy")
+
+    def _remove_stale(self, cache_path):
+        """
+        Removes older cache files of the same note (changed source file or rate).
+        """
+        prefix = os.path.basename(cache_path).split("-")[0] + "-"
+        for entry in os.listdir(self.cache_dir):
+            if entry.startswith(prefix) and entry.endswith(".npy") and entry != os.path.basename(cache_path):
+                os.remove(os.path.join(self.cache_dir, entry))
+
+    def _load(self, path):
+        cache_path = self._cache_path(path)
+        if os.path.exists(cache_path):
+            return np.load(cache_path, mmap_mode="r")
+
+        import librosa  # Only needed when a note is not in the cache yet
+        y, _ = librosa.load(path, sr=self.rate, mono=True)
+        y = np.ascontiguousarray(y, dtype=np.float32)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, y)
+        os.replace(tmp_path, cache_path)  # Never leave a half written cache file behind
+        self._remove_stale(cache_path)
+        return np.load(cache_path, mmap_mode="r")
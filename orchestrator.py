@@ -0,0 +1,79 @@
+"""
+Description: Runs the guitar note recognition game on a whole classroom of robots from one process.
+             Every realm in the config file gets its own WAMP component and game session, all on
+             the same reactor. The audio assets (and the asset server) are shared by all the
+             sessions, the game state (score, current note) is kept per session. Every robot
+             gets its own latency metrics and trace in TRACE_DIR, named after its realm.
+             A robot whose connection drops reconnects on its own and resumes its game where it stopped.
+             Run it with: python orchestrator.py robots.json
+
+Config file (JSON):
+    {
+        "url": "ws://wamp.robotsindeklas.nl",
+        "realms": ["rie.666ab353961f249628fc272e", {"realm": "rie.other", "url": "ws://127.0.0.1:8080/ws"}]
+    }
+A realm can be given as a string, or as an object to use another url for that robot.
+"""
+
+import json
+import sys
+
+from autobahn.twisted.component import Component, run
+from twisted.internet import reactor
+
+import SRP_Final_Assignment_Joris_Postmus_Group11 as game
+from reconnect import transport
+
+DEFAULT_URL = "ws://wamp.robotsindeklas.nl"
+
+
+def load_config(path):
+    """
+    Reads the config file, returns a list of (url, realm) with one entry per robot.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    url = config.get("url", DEFAULT_URL)
+    robots = []
+    for entry in config["realms"]:
+        if isinstance(entry, str):
+            robots.append((url, entry))
+        else:
+            robots.append((entry.get("url", url), entry["realm"]))
+    return robots
+
+
+def make_component(url, realm, states):
+    """
+    Component that plays the game on the robot of one realm, its GameState is added to states.
+    """
+    component = Component(transports=[transport(url)], realm=realm)
+
+    def on_join(session, details):
+        state = states[realm] = game.resume_state(realm)
+        return game.run_traced(session, state)
+
+    component.on_join(on_join)
+    return component
+
+
+def print_scores(states):
+    for realm, state in sorted(states.items()):
+        print(f"{realm}: {state.correct_answers} correct answers in round {state.round + 1}")
+
+
+def main(config_path):
+    robots = load_config(config_path)
+    states = {}
+    components = [make_component(url, realm, states) for url, realm in robots]
+    print(f"Starting the game on {len(components)} robots")
+    game.assets.start()  # One asset server (and cache) for all the robots
+    reactor.addSystemEventTrigger("before", "shutdown", print_scores, states)
+    run(components)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python orchestrator.py robots.json")
+        sys.exit(1)
+    main(sys.argv[1])
@@ -0,0 +1,201 @@
+"""
+Description: Streaming pitch detection of the robot microphone, so the player can sing or play a note back.
+             Microphone frames (16 bit PCM) go into a preallocated ring buffer. Every hop the
+             YIN estimator runs on the newest window: the difference function for all lags at
+             once (the autocorrelation as a cross-correlation by FFT and the lag energies as a
+             cumulative sum), the cumulative mean normalized difference and the first dip under
+             the threshold. Once the last few estimates agree on a note, that note is the answer.
+             All the sample, work and spectrum arrays are allocated up front, the per-frame path
+             only writes into them (the FFTs run in float64, in float32 they allocate a buffer).
+"""
+
+import numpy as np
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, inlineCallbacks
+
+from note_audio import ROBOT_SAMPLE_RATE
+
+NOTE_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+LISTEN_TIMEOUT = 8  # Seconds to wait for a stable note
+
+
+class PitchDetector:
+    """
+    Incremental YIN pitch estimator. push() the microphone samples, it returns a note name once the pitch is stable.
+    """
+
+    def __init__(self, rate=ROBOT_SAMPLE_RATE, window=1024, hop=256, fmin=70.0, fmax=1000.0,
+                 threshold=0.15, stable_hops=4, tolerance_cents=50):
+        self.rate = rate
+        self.window = window
+        self.hop = hop
+        self.threshold = threshold
+        self.tolerance = tolerance_cents / 100  # In semitones
+        self.min_lag = max(2, int(rate / fmax))
+        self.max_lag = int(rate / fmin) + 1
+        span = window + self.max_lag + 1  # Samples one estimate looks at
+
+        # Ring buffer of the newest samples, twice the span so the newest span is always contiguous
+        self._ring = np.zeros(2 * span, dtype=np.float32)
+        self._span = span
+        self._write = span  # Everything before _write is valid history
+        self._pending = 0  # Samples since the last estimate
+
+        # Work arrays of the estimator, _frame holds the newest span while estimating. The FFT size is
+        # at least the span, so the correlation of the window with the span does not wrap around
+        lags = self.max_lag + 1
+        fft_size = 1 << (span - 1).bit_length()
+        self._padded_frame = np.zeros(fft_size, dtype=np.float64)
+        self._padded_head = np.zeros(fft_size, dtype=np.float64)  # Only the first window samples are set
+        self._frame = self._padded_frame[:span]
+        self._head = self._padded_head[:window]
+        self._frame_spectrum = np.zeros(fft_size // 2 + 1, dtype=np.complex128)
+        self._head_spectrum = np.zeros(fft_size // 2 + 1, dtype=np.complex128)
+        self._correlation = np.zeros(fft_size, dtype=np.float64)
+        self._lag_energy = np.zeros(lags, dtype=np.float64)
+        self._squares = np.zeros(span, dtype=np.float64)
+        self._energy = np.zeros(span + 1, dtype=np.float64)  # _energy[k] = sum of the first k squares
+        self._acf = self._correlation[:lags]
+        self._diff = np.zeros(lags, dtype=np.float64)
+        self._cmnd = np.ones(lags, dtype=np.float64)
+        self._cumulative = np.zeros(lags, dtype=np.float64)
+        self._below = np.zeros(lags, dtype=bool)
+        self._positive = np.zeros(lags - 1, dtype=bool)
+        self._lag_numbers = np.arange(lags, dtype=np.float64)
+        self._estimates = np.full(stable_hops, np.nan)  # Last estimates as (fractional) MIDI numbers
+        self._distance = np.zeros(stable_hops)
+        self._estimate_count = 0
+
+    def reset(self):
+        self._ring[:] = 0
+        self._write = self._span
+        self._pending = 0
+        self._estimates[:] = np.nan
+        self._estimate_count = 0
+
+    def push(self, samples):
+        """
+        Adds microphone samples (int16 array or bytes of 16 bit PCM), returns the note name once it is stable.
+        """
+        if isinstance(samples, (bytes, bytearray, memoryview)):
+            samples = np.frombuffer(samples, dtype=np.int16)
+        note = None
+        start = 0
+        while start < len(samples):
+            count = min(len(samples) - start, self.hop - self._pending)
+            self._append(samples[start:start + count])
+            start += count
+            self._pending += count
+            if self._pending == self.hop:
+                self._pending = 0
+                found = self._estimate()
+                if found is not None:
+                    note = found
+        return note
+
+    def _append(self, samples):
+        if self._write + len(samples) > len(self._ring):  # Move the newest span to the front of the ring
+            self._ring[:self._span] = self._ring[self._write - self._span:self._write]
+            self._write = self._span
+        target = self._ring[self._write:self._write + len(samples)]
+        if samples.dtype == np.int16:
+            np.multiply(samples, np.float32(1 / 32768), out=target)
+        else:
+            target[:] = samples
+        self._write += len(samples)
+
+    def pitch(self):
+        """
+        YIN estimate of the newest window in Hz, or None when there is no clear pitch.
+        """
+        np.copyto(self._frame, self._ring[self._write - self._span:self._write])
+        window, lags = self.window, len(self._acf)
+
+        # Difference function d(lag) = e(0) + e(lag) - 2 r(lag) for all lags at once,
+        # e(lag) is the energy of the window shifted by lag and r the autocorrelation:
+        # r(lag) = sum of head[j] * frame[j + lag], the inverse FFT of conj(FFT(head)) * FFT(frame)
+        np.copyto(self._head, self._frame[:window])
+        np.fft.rfft(self._padded_frame, out=self._frame_spectrum)
+        np.fft.rfft(self._padded_head, out=self._head_spectrum)
+        np.conjugate(self._head_spectrum, out=self._head_spectrum)
+        np.multiply(self._frame_spectrum, self._head_spectrum, out=self._frame_spectrum)
+        np.fft.irfft(self._frame_spectrum, n=len(self._correlation), out=self._correlation)
+        np.multiply(self._frame, self._frame, out=self._squares)
+        np.cumsum(self._squares, out=self._energy[1:])
+        np.subtract(self._energy[window:window + lags], self._energy[:lags], out=self._lag_energy)
+        np.add(self._lag_energy, self._lag_energy[0], out=self._diff)
+        np.multiply(self._acf, 2, out=self._acf)
+        np.subtract(self._diff, self._acf, out=self._diff)
+
+        # Cumulative mean normalized difference, then the first dip under the threshold
+        np.cumsum(self._diff[1:], out=self._cumulative[1:])
+        np.multiply(self._diff[1:], self._lag_numbers[1:], out=self._cmnd[1:])
+        np.greater(self._cumulative[1:], 0, out=self._positive)
+        np.divide(self._cmnd[1:], self._cumulative[1:], out=self._cmnd[1:], where=self._positive)
+        np.less(self._cmnd[self.min_lag:], self.threshold, out=self._below[self.min_lag:])
+        lag = self.min_lag + int(self._below[self.min_lag:].argmax())
+        if not self._below[lag]:
+            return None
+        while lag + 1 < lags and self._cmnd[lag + 1] < self._cmnd[lag]:
+            lag += 1
+        if lag + 1 < lags:  # Parabolic interpolation between the neighbouring lags
+            a, b, c = self._cmnd[lag - 1], self._cmnd[lag], self._cmnd[lag + 1]
+            curve = a - 2 * b + c
+            if curve > 0:
+                return self.rate / (lag + 0.5 * (a - c) / curve)
+        return self.rate / lag
+
+    def _estimate(self):
+        frequency = self.pitch()
+        midi = np.nan if frequency is None else 69 + 12 * np.log2(frequency / 440)
+        self._estimates[self._estimate_count % len(self._estimates)] = midi
+        self._estimate_count += 1
+        if self._estimate_count < len(self._estimates) or np.isnan(self._estimates.sum()):
+            return None
+        # Stable when all the last estimates are within the tolerance of each other (octaves do not matter)
+        reference = self._estimates[0]
+        np.subtract(self._estimates, reference - 6, out=self._distance)
+        np.remainder(self._distance, 12, out=self._distance)
+        np.subtract(self._distance, 6, out=self._distance)
+        np.abs(self._distance, out=self._distance)
+        if self._distance.max() > self.tolerance:
+            return None
+        return NOTE_NAMES[int(round(reference)) % 12]
+
+
+def frame_samples(frame):
+    """
+    PCM bytes of a rom.sensor.hearing.stream frame ({"data": {<microphone>: bytes}}, or the bytes themselves).
+    """
+    if isinstance(frame, dict):
+        data = frame.get("data", frame)
+        return next(iter(data.values())) if isinstance(data, dict) else data
+    return frame
+
+
+@inlineCallbacks
+def listen_for_note(session, timeout=LISTEN_TIMEOUT, detector=None):
+    """
+    Listens to the robot microphone until the player sings or plays a stable note, returns its name (None on timeout).
+    """
+    detector = detector or PitchDetector()
+    heard = Deferred()
+
+    def on_frame(frame):
+        if heard.called:
+            return
+        note = detector.push(frame_samples(frame))
+        if note is not None:
+            heard.callback(note)
+
+    timer = reactor.callLater(timeout, lambda: heard.called or heard.callback(None))
+    subscription = yield session.subscribe(on_frame, "rom.sensor.hearing.stream")
+    yield session.call("rom.sensor.hearing.stream")
+    try:
+        note = yield heard
+    finally:
+        if timer.active():
+            timer.cancel()
+        yield session.call("rom.sensor.hearing.close")
+        yield subscription.unsubscribe()
+    return note
@@ -1,10 +1,14 @@
 from autobahn.twisted.component import Component, run
 from twisted.internet.defer import inlineCallbacks
+from twisted.internet.threads import deferToThread
 from autobahn.twisted.util import sleep
-import librosa
-import os.path
-import numpy as np
 import random
+from note_audio import NoteAudioStore
+from gestures import HAPPY, SAD
+import audio_transport
+from vision_events import SubscriptionRegistry, CardEventPipeline
+from action_plan import ActionPlan
+from reconnect import transport
 
 # Functions that activate when the robot's builtin sensors are activated: touch-sensor on head, scanning for aruco, etc
 # B--B--BB--B--BB--B--BB--B--BB--B--BB--B--BB--B--BB--B--BB--B--BB--B--BB--B--BB--B--B
@@ -13,17 +17,27 @@ def touched(session, frame):
     """This function is called when the robot is touched on the head"""
     if "body.head.middle" in frame["data"]:
         print("Head touched!")
-        yield session.subscribe(on_card, "rie.vision.card.stream")
-        yield session.call("rie.vision.card.stream")
+        # Only the first touch subscribes and starts the card stream, later touches reuse it.
+        # The pipeline ignores a card that is still in sight and lets one answer be spoken at a time,
+        # it is made per session so after a reconnect the cards are answered on the new session
+        subscriptions = SubscriptionRegistry.of(session)
+        if "rie.vision.card.stream" not in subscriptions:
+            yield subscriptions.subscribe("rie.vision.card.stream", card_handler, start="rie.vision.card.stream")
+
+
+def card_handler(session):
+    """Handler of the card stream of session"""
+    cards = CardEventPipeline(lambda marker: on_card(session, marker))
+    return cards.on_frame
 
 
 @inlineCallbacks
-def on_card(session, frame):
-    """This function is called every time the robot sees a card"""
-    print(frame[0])  # prints the seen MarkerID
+def on_card(session, marker):
+    """This function is called every time the robot sees a new card"""
+    print(marker)  # prints the seen MarkerID
 
     correct_answer = 0  # Set the MarkerID of the correct answer
-    current_answer = frame[0]  # Get the MarkerID of the detected card
+    current_answer = marker  # The MarkerID of the detected card
 
     if current_answer == correct_answer:
         yield session.call("rie.dialogue.say", text="Amazing! that's the right answer!")
@@ -50,33 +64,8 @@ def happy(session):
                            "-character-wee-1-188162.mp3",
                        sync=False
                        )
-    yield session.call("rom.actuator.motor.write",
-                       frames=[
-                           # Right arm wave motion ! NOTE: The elements of the 'data' dictionary have to always be
-                           # the same for all the frames even if the value is the same(e.g. we have to always have
-                           # "body.arms.right.upper.pitch" and "body.arms.right.lower.roll" in the dictionary even if
-                           # the value is the same for all the frames)
-                           {"time": 0, "data": {"body.arms.right.upper.pitch": -2.5, "body.arms.right.lower.roll": 3,
-                                                "body.arms.left.upper.pitch": -2.5, "body.arms.left.lower.roll": 3,
-                                                "body.head.pitch": 0.0}},
-                           {"time": 2000, "data": {"body.arms.right.upper.pitch": -2.5, "body.arms.right.lower.roll": 2,
-                                                   "body.arms.left.upper.pitch": -2.5, "body.arms.left.lower.roll": 2,
-                                                   "body.head.pitch": 0.175}},
-                           {"time": 3000,
-                            "data": {"body.arms.right.upper.pitch": -2.5, "body.arms.right.lower.roll": -1,
-                                     "body.arms.left.upper.pitch": -2.5, "body.arms.left.lower.roll": -1,
-                                     "body.head.pitch": -0.175}},
-                           {"time": 4000, "data": {"body.arms.right.upper.pitch": -2.5, "body.arms.right.lower.roll": 3,
-                                                   "body.arms.left.upper.pitch": -2.5, "body.arms.left.lower.roll": 3,
-                                                   "body.head.pitch": 0.175}},
-                           {"time": 5000,
-                            "data": {"body.arms.right.upper.pitch": -2.5, "body.arms.right.lower.roll": -1,
-                                     "body.arms.left.upper.pitch": -2.5, "body.arms.left.lower.roll": -1,
-                                     "body.head.pitch": 0.0}},
-                       ],
-                       force=True,
-                       sync=True
-                       )
+    # Both arms up waving while nodding, the frames are compiled once in gestures.py
+    yield session.call("rom.actuator.motor.write", frames=HAPPY.frames, force=True, sync=True)
 
 
 @inlineCallbacks
@@ -86,44 +75,9 @@ def sad(session):
                            "-male-103153.mp3",
                        sync=False
                        )
-    # Repeat the sad movement 3 times
-    for _ in range(3):
-        # Lower the head
-        yield session.call("rom.actuator.motor.write",
-                           frames=[
-                               {"time": 500,
-                                "data": {"body.head.pitch": 1.5}},
-                           ],
-                           force=True,
-                           sync=True
-                           )
-        yield sleep(0.5)
-
-        # Move the arms like a sobbing gesture
-        yield session.call("rom.actuator.motor.write",
-                           frames=[
-                               {"time": 500,
-                                "data": {"body.arms.right.upper.pitch": -1.5, "body.arms.right.lower.roll": 0,
-                                         "body.arms.left.upper.pitch": -1.5, "body.arms.left.lower.roll": 0}},
-                               {"time": 1000,
-                                "data": {"body.arms.right.upper.pitch": 0, "body.arms.right.lower.roll": 0,
-                                         "body.arms.left.upper.pitch": 0, "body.arms.left.lower.roll": 0}},
-                           ],
-                           force=True,
-                           sync=True
-                           )
-        yield sleep(0.5)
-
-        # Raise the head
-        yield session.call("rom.actuator.motor.write",
-                           frames=[
-                               {"time": 500,
-                                "data": {"body.head.pitch": 0}},
-                           ],
-                           force=True,
-                           sync=True
-                           )
-        yield sleep(0.5)
+    # Repeat the sad movement 3 times, all three in a single motor write (see SAD in gestures.py)
+    yield session.call("rom.actuator.motor.write", frames=SAD.frames, force=True, sync=True)
+    yield sleep(0.5)
 
     # Make a sad sound or say a sad phrase
     yield session.call("rom.actuator.audio.stream",
@@ -136,9 +90,17 @@ def sad(session):
 
 @inlineCallbacks
 def main(session, details):
-    info = yield session.call("rom.sensor.hearing.info")
-    # setting of standard language to English
-    yield session.call("rie.dialogue.config.language", lang="en")
+    # After a reconnect, the streams of the lost session (the card stream) are subscribed again
+    yield SubscriptionRegistry.rejoin(session, details.realm)
+
+    # The notes are decoded in the background while the robot starts talking (only when the program starts, not on a rejoin)
+    audio_loaded = load_audio()
+
+    # hearing info and setting of standard language to English, both at the same time
+    plan = ActionPlan()
+    plan.call("rom.sensor.hearing.info")
+    plan.call("rie.dialogue.config.language", lang="en")
+    yield plan.run(session)
 
     # smart starting question and keyword answers
     # priming
@@ -152,6 +114,7 @@ def main(session, details):
         # Message preceding the note showcase
         yield session.call("rie.dialogue.say",
                            text="All right, let me play all the notes for you to start with")
+        yield audio_loaded  # Long done by now, the question took a couple of seconds
         showcase_notes(session)  # Note showcase (duh)
         correct_answers = main_loop(session)  # enters main game loop
 
@@ -188,7 +151,8 @@ def main(session, details):
 def main_loop(session):
     """ Main loop of our game, the robot announces that he will play a note,
         the player is supposed to then say out loud the note that he or she thinks was played.
-        Only takes the current session as argument but needs the right .wav files in the Audio directory"""
+        Only takes the current session as argument but needs the right .wav files in the Audio directory
+        (decoded once at startup into note_audio)"""
 
     correct_answers = 0
     for i in range(5):
@@ -199,9 +163,9 @@ def main_loop(session):
         random_note1st = random.randint(0, 5) + 65
         random_note2nd = random.randint()
         # Playing of random note
-        if os.path.exists(os.path.abspath("Audio\\" + chr(random_note) + ".wav")):
-            y, sr = librosa.load("Audio\\" + chr(random_note) + ".wav")
-            yield session.call("rom.actuator.audio.play", data=y, rate=sr, sync=True)
+        y = note_audio.get(chr(random_note))
+        if y is not None:
+            yield audio_transport.play(session, y, note_audio.rate)  # 16 bit PCM, in chunks
 
         # Please tell me what note it is and listen for response, second smart question and keyword answers
         question = "Could you please tell me what Note I just played?"
@@ -253,17 +217,30 @@ def showcase_notes(session):
     for i in range(6):
         # the 65th character in ASCII is 'A'
         note = 65 + i
-        if os.path.exists(os.path.abspath("Audio\\" + chr(note) + ".wav")):
-            y, sr = librosa.load("Audio\\" + chr(note) + ".wav")
-            yield session.call("rom.actuator.audio.play", data=y, rate=sr, sync=True)
+        y = note_audio.get(chr(note))
+        if y is not None:
+            yield audio_transport.play(session, y, note_audio.rate)  # 16 bit PCM, in chunks
+
+
+# The notes are decoded once (when the game starts, see main) instead of every time a note is played
+note_audio = NoteAudioStore("Audio")
+_audio_loaded = None  # Deferred of the decoding, shared by every session of this process
+
+
+def load_audio():
+    """
+    Starts decoding the notes in a thread the first time it is called, returns the Deferred that fires when they are done.
+    A failure is printed (the notes that did not load are not played), it is not raised in the session that waits for it.
+    """
+    global _audio_loaded
+    if _audio_loaded is None:
+        _audio_loaded = deferToThread(note_audio.load_all)
+        _audio_loaded.addErrback(lambda failure: print(f"Loading the notes failed: {failure.getErrorMessage()}"))
+    return _audio_loaded
 
 
 wamp = Component(
-    transports=[{
-        "url": "ws://wamp.robotsindeklas.nl",
-        "serializers": ["msgpack"],
-        "max_retries": 0
-    }],
+    transports=[transport("ws://wamp.robotsindeklas.nl")],  # Reconnects (with backoff) when the connection drops
     realm="rie.66350585c887f6d074f03970",
 )
 
@@ -0,0 +1,101 @@
+"""
+Description: Reconnecting to the robot and resuming the game where it stopped, after the connection dropped.
+             transport gives the settings of a WAMP transport that keeps reconnecting after a drop,
+             with a delay that grows exponentially (with random jitter, so a classroom of robots
+             does not reconnect all at the same moment), and with WebSocket keepalive pings, so a
+             link that went dead without closing is noticed within seconds instead of at the next call.
+             CheckpointStore keeps the last checkpoint of the game on every realm (where the game is,
+             the score and the planned notes) in memory and in a small JSON file per realm, so the
+             session that joins after the reconnect resumes there. After a restart of the program
+             the file is only resumed when it is recent, an older one is from another player.
+
+Example:
+    component = Component(transports=[transport("ws://wamp.robotsindeklas.nl")], realm=realm)
+    store = CheckpointStore("checkpoints")
+    store.save(realm, state.checkpoint())
+    saved = store.load(realm)  # None when the game on realm finished (or never started)
+"""
+
+import json
+import os
+import time
+
+INITIAL_RETRY_DELAY = 0.25  # Seconds, the first attempt after a drop is made right away, the next ones wait 0.5, 1, 2, ...
+RETRY_DELAY_GROWTH = 2.0  # Every next attempt waits this much longer
+RETRY_DELAY_JITTER = 0.2  # Standard deviation of the delay, relative to the delay
+MAX_RETRY_DELAY = 10  # Seconds, the delay stops growing here
+KEEPALIVE_INTERVAL = 2  # Seconds between WebSocket pings
+KEEPALIVE_TIMEOUT = 3  # Seconds without a pong before the connection is dropped (and the reconnecting starts)
+MAX_RESTART_AGE = 600  # Seconds a checkpoint of an earlier run of the program is resumed, after that a new game starts
+
+
+def transport(url, serializers=("msgpack",), max_retries=-1):
+    """
+    Transport settings of an autobahn Component that reconnects (max_retries -1: forever) and sends keepalive pings.
+    """
+    return {
+        "url": url,
+        "serializers": list(serializers),
+        "max_retries": max_retries,
+        "initial_retry_delay": INITIAL_RETRY_DELAY,
+        "retry_delay_growth": RETRY_DELAY_GROWTH,
+        "retry_delay_jitter": RETRY_DELAY_JITTER,
+        "max_retry_delay": MAX_RETRY_DELAY,
+        "options": {
+            "autoPingInterval": KEEPALIVE_INTERVAL,
+            "autoPingTimeout": KEEPALIVE_TIMEOUT,
+        },
+    }
+
+
+class CheckpointStore:
+    """
+    Last checkpoint (a JSON dict) per name, in memory and in <name>.json in directory (None: in memory only).
+    A file that was saved more than max_age seconds ago by an earlier run of the program is not resumed.
+    """
+
+    def __init__(self, directory=None, max_age=MAX_RESTART_AGE):
+        self.directory = directory
+        self.max_age = max_age
+        self._checkpoints = {}  # name -> checkpoint saved by this run
+
+    def path(self, name):
+        return os.path.join(self.directory, f"{name}.json")
+
+    def save(self, name, checkpoint):
+        """
+        Keeps checkpoint as the last one of name. The file is replaced in one go, a crash while writing leaves the one before.
+        """
+        self._checkpoints[name] = checkpoint
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.path(name) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"saved_at": time.time(), "checkpoint": checkpoint}, f)
+        os.replace(tmp_path, self.path(name))
+
+    def load(self, name):
+        """
+        The last checkpoint of name, or None. A checkpoint of this run (a reconnect) is always returned,
+        one of an earlier run only when it is at most max_age seconds old (older ones are cleared).
+        """
+        if name in self._checkpoints:
+            return self._checkpoints[name]
+        if self.directory is None or not os.path.exists(self.path(name)):
+            return None
+        with open(self.path(name)) as f:
+            saved = json.load(f)
+        if not isinstance(saved, dict) or time.time() - saved.get("saved_at", 0) > self.max_age:
+            self.clear(name)
+            return None
+        self._checkpoints[name] = saved["checkpoint"]
+        return saved["checkpoint"]
+
+    def clear(self, name):
+        """
+        Forgets the checkpoint of name, when its game finished.
+        """
+        self._checkpoints.pop(name, None)
+        if self.directory is not None and os.path.exists(self.path(name)):
+            os.remove(self.path(name))
@@ -0,0 +1,315 @@
+"""
+Description: Records game sessions to a compact binary log and replays them without a robot.
+             SessionRecorder wraps a WAMP session and appends a record for every session.call
+             (procedure, arguments, result or error, start time and duration) and for every
+             subscription event to an append-only log. Records are msgpack, serialized with the
+             same msgpack serializer as the WAMP transport, each behind a 4 byte length, so a
+             session that crashed halfway still gives a readable log (the cut off record is skipped).
+             read_log reads a log through mmap. ReplaySession answers the calls of the game with
+             the recorded results, and sends the recorded events to its subscribers, at the
+             recorded speed or as fast as possible. The seed of the GameState is in the log, so the
+             game plays the same notes again and the replay is deterministic. A session that resumed
+             a game after a reconnect also has the checkpoint it resumed from, the replay starts there.
+             Urls of audio files are compared by their cache key, the recording has the urls of the
+             asset proxy on the LAN where the replay (without the proxy) has the original urls.
+             Run it with: python session_log.py replay <log> [--speed 1.0]  (no --speed: as fast as possible)
+                          python session_log.py dump <log>
+"""
+
+import argparse
+import io
+import mmap
+import struct
+import sys
+import time
+from collections import defaultdict, deque
+from contextlib import redirect_stdout
+
+import txaio
+txaio.use_twisted()  # Has to be chosen before the serializer module is imported
+from autobahn.wamp.exception import ApplicationError
+from autobahn.wamp.serializer import MsgPackObjectSerializer
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, fail, inlineCallbacks, maybeDeferred, succeed
+from twisted.internet.task import react
+
+from asset_proxy import served_key
+
+LOG_VERSION = 1
+_LENGTH = struct.Struct("<I")
+_serializer = MsgPackObjectSerializer()
+
+# Record layouts, the first field is the kind of record
+# ["session", version, realm, seed, wall clock time, checkpoint the game resumed from (or None)]
+# ["call", seq, start, seconds, procedure, args, kwargs, ok, result or [error uri, message]]
+# ["event", time, seq of the last call made before it, topic, args, kwargs]
+
+
+def _pack(record):
+    payload = _serializer.serialize(record)
+    return _LENGTH.pack(len(payload)) + payload
+
+
+def read_log(path):
+    """
+    Yields the records of a log in order. A record that was cut off at the end (crash while writing) is skipped.
+    """
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            position = 0
+            while position + _LENGTH.size <= len(data):
+                length, = _LENGTH.unpack_from(data, position)
+                end = position + _LENGTH.size + length
+                if end > len(data):
+                    break
+                yield _serializer.unserialize(data[position + _LENGTH.size:end])[0]
+                position = end
+
+
+class SessionRecorder:
+    """
+    Wraps a session and writes every call and subscription event to a new log at path (an existing file is not
+    appended to, so two sessions never end up in one log). Everything else is passed on to the session.
+    """
+
+    def __init__(self, session, path, realm=None, seed=None, checkpoint=None):
+        self.session = session
+        self.path = path
+        self._file = open(path, "xb")
+        self._seq = 0
+        self._start = time.perf_counter()
+        self._write(["session", LOG_VERSION, realm, seed, time.time(), checkpoint])
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def _write(self, record):
+        self._file.write(_pack(record))
+        self._file.flush()  # A crash loses at most the calls in flight
+
+    def call(self, procedure, *args, **kwargs):
+        seq = self._seq
+        self._seq += 1
+        start = time.perf_counter()
+
+        def record(result, ok):
+            if not self._file.closed:
+                if ok:
+                    value = result
+                elif isinstance(result.value, ApplicationError):
+                    value = [result.value.error, result.value.error_message()]
+                else:
+                    value = [ApplicationError.RUNTIME_ERROR, result.getErrorMessage()]
+                self._write(["call", seq, start - self._start, time.perf_counter() - start,
+                             procedure, list(args), kwargs, ok, value])
+            return result
+
+        d = maybeDeferred(self.session.call, procedure, *args, **kwargs)
+        d.addCallbacks(record, record, callbackArgs=(True,), errbackArgs=(False,))
+        return d
+
+    def subscribe(self, handler, topic=None, *args, **kwargs):
+        def recorded_handler(*event_args, **event_kwargs):
+            if not self._file.closed:
+                self._write(["event", time.perf_counter() - self._start, self._seq - 1, topic, list(event_args), event_kwargs])
+            return handler(*event_args, **event_kwargs)
+
+        return self.session.subscribe(recorded_handler, topic, *args, **kwargs)
+
+    def close(self):
+        self._file.close()
+
+
+class ReplayError(Exception):
+    """
+    The game made a call that is not in the log, so there is no result to give.
+    """
+
+
+def _roundtrip(value):
+    """
+    value as the other side of the transport would get it (tuples become lists, memoryviews bytes and so on).
+    """
+    return _serializer.unserialize(_serializer.serialize(value))[0]
+
+
+def _comparable(args, kwargs):
+    """
+    [args, kwargs] of a call with every url replaced by its asset cache key, so a proxied and an original url are equal.
+    """
+    def normalize(value):
+        return served_key(value) if isinstance(value, str) and value.startswith(("http://", "https://")) else value
+
+    return [[normalize(value) for value in args], {key: normalize(value) for key, value in kwargs.items()}]
+
+
+class _Subscription:
+    def __init__(self, handlers, handler):
+        self._handlers = handlers
+        self._handler = handler
+
+    def unsubscribe(self):
+        if self._handler in self._handlers:
+            self._handlers.remove(self._handler)
+        return succeed(None)
+
+
+class ReplaySession:
+    """
+    Stands in for the session of a recorded game: calls get the recorded results, per procedure in the order they were made.
+    speed=None answers right away, otherwise a call takes its recorded time divided by speed (1.0 is the recorded speed).
+    An event is sent once the call made before it has been replayed, after the same time as in the recording.
+    Calls whose arguments differ from the recording are kept in mismatches (check=False skips the comparison).
+    """
+
+    def __init__(self, records, speed=None, check=True, clock=reactor):
+        records = list(records)
+        if not records or records[0][0] != "session":
+            raise ValueError("Not a session log")
+        later = next((i for i, record in enumerate(records[1:], 1) if record[0] == "session"), None)
+        if later is not None:
+            records = records[:later]  # Older logs could have a second session appended, only the first is replayed
+        _, version, self.realm, self.seed, self.recorded_at, *resumed = records[0]
+        self.checkpoint = resumed[0] if resumed else None  # Logs from before resuming have no checkpoint
+        if version != LOG_VERSION:
+            raise ValueError(f"Session log version {version} is not supported")
+        self.speed = speed
+        self.check = check
+        self.clock = clock
+        self._calls = defaultdict(deque)  # procedure -> recorded calls, in the order they were made
+        self._starts = {}  # seq -> recorded start time of the call
+        for record in sorted((r for r in records if r[0] == "call"), key=lambda r: r[1]):
+            self._calls[record[4]].append(record)
+            self._starts[record[1]] = record[2]
+        self._events = deque(r for r in records if r[0] == "event")
+        self._handlers = defaultdict(list)  # topic -> handlers
+        self._replayed_seq = -1  # Highest seq of the calls replayed so far
+        self.calls = 0
+        self.events = 0
+        self.dropped_events = 0  # Events without a subscriber when they were due
+        self.mismatches = []  # (procedure, recorded [args, kwargs], replayed [args, kwargs])
+        self.left = Deferred()
+
+    @classmethod
+    def from_log(cls, path, speed=None, check=True, clock=reactor):
+        return cls(read_log(path), speed, check, clock)
+
+    def unused_calls(self):
+        """
+        Number of recorded calls the game did not make (again).
+        """
+        return sum(len(calls) for calls in self._calls.values())
+
+    def call(self, procedure, *args, **kwargs):
+        if not self._calls.get(procedure):
+            return fail(ReplayError(f"No recorded call of {procedure} left"))
+        _, seq, _, seconds, _, recorded_args, recorded_kwargs, ok, value = self._calls[procedure].popleft()
+        self.calls += 1
+        if self.check:
+            replayed = _roundtrip([list(args), kwargs])
+            if _comparable(*replayed) != _comparable(recorded_args, recorded_kwargs):
+                self.mismatches.append((procedure, [recorded_args, recorded_kwargs], replayed))
+        if seq > self._replayed_seq:
+            self._replayed_seq = seq
+            self._release_events()
+
+        if self.speed is None:
+            return succeed(value) if ok else fail(ApplicationError(*value))
+        d = Deferred()
+        if ok:
+            self.clock.callLater(seconds / self.speed, d.callback, value)
+        else:
+            self.clock.callLater(seconds / self.speed, d.errback, ApplicationError(*value))
+        return d
+
+    def _release_events(self):
+        while self._events and self._events[0][2] <= self._replayed_seq:
+            event = self._events.popleft()
+            _, at, after, topic, args, kwargs = event
+            delay = 0 if self.speed is None else max(0.0, at - self._starts.get(after, 0.0)) / self.speed
+            self.clock.callLater(delay, self._send_event, topic, args, kwargs)
+
+    def _send_event(self, topic, args, kwargs):
+        if not self._handlers[topic]:
+            self.dropped_events += 1
+            return
+        self.events += 1
+        for handler in list(self._handlers[topic]):
+            d = maybeDeferred(handler, *args, **kwargs)
+            d.addErrback(lambda failure: print(f"Handling event of {topic} failed: {failure.getErrorMessage()}"))
+
+    def subscribe(self, handler, topic=None, *args, **kwargs):
+        self._handlers[topic].append(handler)
+        return succeed(_Subscription(self._handlers[topic], handler))
+
+    def leave(self, *args, **kwargs):
+        if not self.left.called:
+            self.left.callback(None)
+
+
+@inlineCallbacks
+def replay(path, speed=None, check=True):
+    """
+    Plays the recorded game again with main of the game, returns (ReplaySession, GameState, seconds it took).
+    """
+    import SRP_Final_Assignment_Joris_Postmus_Group11 as game  # Imported here, the game imports this module itself
+
+    session = ReplaySession.from_log(path, speed, check)
+    if session.checkpoint is not None:
+        state = game.GameState.from_checkpoint(session.checkpoint)
+    else:
+        state = game.GameState(session.realm, seed=session.seed)
+    start = time.perf_counter()
+    yield game.main(session, state)
+    return session, state, time.perf_counter() - start
+
+
+def dump(path):
+    for record in read_log(path):
+        if record[0] == "call":
+            _, seq, start, seconds, procedure, args, kwargs, ok, value = record
+            kwargs = {key: f"<{len(v)} bytes>" if isinstance(v, bytes) else v for key, v in kwargs.items()}
+            print(f"{start:9.3f} {seconds:7.3f}  #{seq} {procedure} {kwargs} -> {value if ok else 'ERROR ' + str(value)}")
+        elif record[0] == "event":
+            print(f"{record[1]:9.3f}          event {record[3]} ({len(record[4])} args)")
+        else:
+            resumed = f", resumed at step {record[5]['step']} round {record[5]['round'] + 1}" if record[5:] and record[5] else ""
+            print(f"session of realm {record[2]}, seed {record[3]}, recorded {time.ctime(record[4])}{resumed}")
+
+
+def main(reactor, args):
+    parser = argparse.ArgumentParser(description="Replays or shows a recorded game session.")
+    parser.add_argument("command", choices=["replay", "dump"])
+    parser.add_argument("log")
+    parser.add_argument("--speed", type=float, default=None, help="1.0 replays at the recorded speed, leave out to replay as fast as possible")
+    args = parser.parse_args(args)
+    if args.command == "dump":
+        dump(args.log)
+        return succeed(None)
+
+    def report(result):
+        session, state, seconds = result
+        print(f"Replayed {session.calls} calls and {session.events} events in {seconds:.3f} s "
+              f"({'as fast as possible' if args.speed is None else f'speed {args.speed}'})")
+        if args.speed is None and session.calls:
+            print(f"Code path overhead: {seconds / session.calls * 1e6:.0f} us per call")
+        print(f"Score: {state.correct_answers}")
+        if session.mismatches:
+            print(f"{len(session.mismatches)} calls differ from the recording, first: {session.mismatches[0][0]}")
+        if session.unused_calls() or session.dropped_events:
+            print(f"Not replayed: {session.unused_calls()} calls, {session.dropped_events} events")
+
+    quiet = redirect_stdout(io.StringIO())  # Keep the prints of the game out of the report
+    quiet.__enter__()
+
+    def restore(result):
+        quiet.__exit__(None, None, None)
+        return result
+
+    return replay(args.log, args.speed).addBoth(restore).addCallback(report)
+
+
+if __name__ == "__main__":
+    react(main, (sys.argv[1:],))
@@ -0,0 +1,344 @@
+"""
+Description: Local stand-in for the robot hub, to run the game without an AlphaMini.
+             SimulatedRouter is a minimal WAMP router (WebSocket + msgpack) that answers the
+             rie.* and rom.* calls the game makes itself, with one SimulatedRobot per realm.
+             It implements just enough of WAMP for the game: joining a realm, calls,
+             subscriptions and events, and leaving.
+             Every procedure can be given a latency (seconds, or a function of the call's
+             arguments) with random jitter, ROBOT_LATENCY has the timings of a real robot.
+             InProcessSession hands the calls of the game straight to a SimulatedRobot, without a
+             router, and run_on_clock runs it on a virtual clock, for benchmarks that take no real time.
+             Run it with: python simulated_robot.py [port] [--realistic]
+             and point the transport url of the game (or the orchestrator config) to ws://127.0.0.1:<port>/ws
+"""
+
+import itertools
+import random
+import sys
+
+from autobahn.twisted.websocket import WampWebSocketServerFactory
+from autobahn.wamp import message
+from autobahn.wamp.role import RoleBrokerFeatures, RoleDealerFeatures
+from autobahn.wamp.serializer import MsgPackSerializer
+from twisted.internet import reactor
+from twisted.internet.defer import maybeDeferred
+from twisted.internet.task import deferLater
+from twisted.python.failure import Failure
+
+DEFAULT_PORT = 8080
+RPC_LATENCY = 0.03  # Seconds of network round trip to the robot hub
+
+# Speech recognition of an answer: the player starts talking after STT_REACTION_SECONDS, every word gives a
+# partial transcript, the transcript is final after STT_ENDPOINT_SECONDS of silence (one word: the 2.5 s of ask)
+STT_REACTION_SECONDS = 1.0
+STT_WORD_SECONDS = 0.4
+STT_ENDPOINT_SECONDS = 1.1
+
+
+# Speech: the robot synthesizes the whole text before it starts talking, then talks at SPEAKING_SECONDS_PER_CHAR
+TTS_SETUP_SECONDS = 0.3
+TTS_SECONDS_PER_CHAR = 0.004
+SPEAKING_SECONDS_PER_CHAR = 0.065
+
+
+def _speech_time(kwargs):
+    return RPC_LATENCY + TTS_SETUP_SECONDS + (TTS_SECONDS_PER_CHAR + SPEAKING_SECONDS_PER_CHAR) * len(kwargs.get("text") or kwargs.get("question") or "")
+
+
+def _audio_time(kwargs):
+    return RPC_LATENCY + (1.5 if kwargs.get("sync", True) else 0)
+
+
+# Seconds until a call returns on a real AlphaMini (roughly measured, speech depends on the length of the text)
+ROBOT_LATENCY = {
+    "rie.dialogue.say": _speech_time,
+    "rie.dialogue.ask": lambda kwargs: _speech_time(kwargs) + 2.5,  # Question + listening to the answer
+    "rie.dialogue.config.language": RPC_LATENCY,
+    "rie.dialogue.stt.stream": RPC_LATENCY,
+    "rie.dialogue.stt.close": RPC_LATENCY,
+    "rie.vision.face.find": RPC_LATENCY + 1.0,
+    "rie.vision.card.stream": RPC_LATENCY,
+    "rom.sensor.hearing.info": RPC_LATENCY,
+    "rom.sensor.hearing.stream": RPC_LATENCY,
+    "rom.sensor.hearing.close": RPC_LATENCY,
+    "rom.sensor.touch.stream": RPC_LATENCY,
+    "rom.actuator.audio.stream": _audio_time,
+    "rom.actuator.audio.play": _audio_time,
+    "rom.actuator.audio.stop": RPC_LATENCY,
+    "rom.actuator.motor.write": lambda kwargs: RPC_LATENCY + (kwargs["frames"][-1]["time"] / 1000 if kwargs.get("sync", True) and kwargs.get("frames") else 0),
+    "rom.optional.behavior.play": RPC_LATENCY + 2.5,
+}
+
+
+class SimulatedRobot:
+    """
+    The robot of one realm: answers the procedures the game calls and keeps a log of all calls.
+    Answers to rie.dialogue.ask are taken from scripted_answers in order, when those run out the
+    first answer that the question accepts is given. rie.dialogue.stt.stream says the next scripted
+    answer word by word as partial transcripts on the rie.dialogue.stt.stream topic.
+    Calls take latency[procedure] seconds (a number, or a function of the call's arguments), varied by
+    +/- jitter (a fraction) and multiplied by time_scale, so benchmarks can run faster than real time.
+    The robot says one text at a time: a rie.dialogue.say that comes in while it talks is synthesized
+    right away, but said after the current text. speech has the (start, end) clock times of every text said.
+    """
+
+    def __init__(self, realm, scripted_answers=(), latency=None, jitter=0.0, time_scale=1.0, seed=None, clock=reactor):
+        self.realm = realm
+        self.scripted_answers = list(scripted_answers)
+        self.latency = latency or {}
+        self.jitter = jitter
+        self.time_scale = time_scale
+        self.clock = clock
+        self._random = random.Random(seed)
+        self.calls = []  # (procedure, kwargs) of every call, in order
+        self._subscribers = {}  # topic -> {router session: subscription id}
+        self._transcript = []  # Delayed calls of the transcript that is being said
+        self.speech = []  # (start, end) of every rie.dialogue.say, in clock seconds
+        self._speaking_until = 0.0
+        self.procedures = {
+            "rie.dialogue.say": lambda text=None, **_: None,
+            "rie.dialogue.ask": self._ask,
+            "rie.dialogue.config.language": lambda lang=None, **_: None,
+            "rie.dialogue.stt.stream": self._stt_stream,
+            "rie.dialogue.stt.close": self._stt_close,
+            "rie.vision.face.find": lambda **_: None,
+            "rie.vision.card.stream": lambda **_: None,
+            "rom.sensor.hearing.info": lambda **_: {"rate": 16000, "channels": 1},
+            "rom.sensor.hearing.stream": lambda **_: None,
+            "rom.sensor.hearing.close": lambda **_: None,
+            "rom.sensor.touch.stream": lambda **_: None,
+            "rom.actuator.audio.stream": lambda url=None, sync=True, **_: None,
+            "rom.actuator.audio.play": lambda data=None, rate=None, sync=True, **_: None,
+            "rom.actuator.audio.stop": lambda sync=True, **_: None,
+            "rom.actuator.motor.write": lambda frames=None, force=False, sync=True, **_: None,
+            "rom.optional.behavior.play": lambda name=None, sync=True, **_: None,
+        }
+
+    def _ask(self, question=None, answers=None, **_):
+        if self.scripted_answers:
+            return self.scripted_answers.pop(0)
+        return next(iter(answers)) if answers else None
+
+    def _stt_stream(self, **_):
+        text = self.scripted_answers.pop(0) if self.scripted_answers else ""
+        words = text.split()
+        at = STT_REACTION_SECONDS
+        for count in range(1, len(words) + 1):
+            at += STT_WORD_SECONDS
+            frame = {"data": {"text": " ".join(words[:count]), "final": False}}
+            self._transcript.append(self.clock.callLater(at * self.time_scale, self.publish, "rie.dialogue.stt.stream", frame))
+        frame = {"data": {"text": text, "final": True}}
+        self._transcript.append(self.clock.callLater((at + STT_ENDPOINT_SECONDS) * self.time_scale, self.publish, "rie.dialogue.stt.stream", frame))
+
+    def _stt_close(self, **_):
+        for call in self._transcript:
+            if call.active():
+                call.cancel()
+        self._transcript = []
+
+    def delay(self, procedure, kwargs):
+        """
+        Seconds that a call to procedure takes.
+        """
+        latency = self.latency.get(procedure, 0.0)
+        if callable(latency):
+            latency = latency(kwargs)
+        if self.jitter:
+            latency *= 1 + self._random.uniform(-self.jitter, self.jitter)
+        return max(0.0, latency) * self.time_scale
+
+    def call(self, procedure, kwargs):
+        """
+        Handles a call of the game, returns the result (or a Deferred of it).
+        Raises KeyError for procedures the robot does not have.
+        """
+        handler = self.procedures[procedure]
+        self.calls.append((procedure, kwargs))
+        delay = self.delay(procedure, kwargs)
+        if procedure == "rie.dialogue.say" and delay > 0:
+            delay = self._queue_speech(kwargs.get("text") or "", delay)
+        if delay > 0:
+            return deferLater(self.clock, delay, handler, **kwargs)
+        return handler(**kwargs)
+
+    def _queue_speech(self, text, delay):
+        """
+        Returns the delay of a say that would take delay seconds on its own, when it has to wait for the text before it.
+        """
+        now = self.clock.seconds()
+        speaking = SPEAKING_SECONDS_PER_CHAR * len(text) * self.time_scale
+        start = max(now + delay - speaking, self._speaking_until)
+        self._speaking_until = start + speaking
+        self.speech.append((start, self._speaking_until))
+        return self._speaking_until - now
+
+    def publish(self, topic, *args, **kwargs):
+        """
+        Sends an event (e.g. a sensor frame) to every session subscribed to the topic.
+        """
+        for session, subscription in list(self._subscribers.get(topic, {}).items()):
+            session.send_event(subscription, args, kwargs)
+
+    def subscribe(self, topic, session, subscription):
+        self._subscribers.setdefault(topic, {})[session] = subscription
+
+    def unsubscribe(self, session, subscription=None):
+        for subscribers in self._subscribers.values():
+            if session in subscribers and subscription in (None, subscribers[session]):
+                del subscribers[session]
+
+
+class _RouterSession:
+    """
+    One connection to the router, the WAMP transport hands every received message to onMessage.
+    """
+    _authid = None  # Read by the autobahn transport when it logs messages
+    _session_id = None
+
+    def __init__(self, router):
+        self.router = router
+        self.robot = None
+        self.transport = None
+        self.hung = False  # The link went dead: nothing is read or sent anymore
+
+    def is_open(self):
+        return not self.hung and self.transport is not None and self.transport.isOpen()
+
+    def onOpen(self, transport):
+        self.transport = transport
+
+    def onClose(self, wasClean):
+        if self.robot is not None:
+            self.robot.unsubscribe(self)
+        self.router.sessions.discard(self)
+
+    def onMessage(self, msg):
+        if isinstance(msg, message.Hello):
+            self.robot = self.router.robot(msg.realm)
+            self.router.sessions.add(self)
+            self._session_id = next(self.router.ids)
+            roles = {"broker": RoleBrokerFeatures(), "dealer": RoleDealerFeatures()}
+            self.transport.send(message.Welcome(self._session_id, roles, realm=msg.realm))
+        elif isinstance(msg, message.Call):
+            self._call(msg)
+        elif isinstance(msg, message.Subscribe):
+            subscription = next(self.router.ids)
+            self.robot.subscribe(msg.topic, self, subscription)
+            self.transport.send(message.Subscribed(msg.request, subscription))
+        elif isinstance(msg, message.Unsubscribe):
+            self.robot.unsubscribe(self, msg.subscription)
+            self.transport.send(message.Unsubscribed(msg.request))
+        elif isinstance(msg, message.Goodbye):
+            self.transport.send(message.Goodbye())
+            self.transport.close()
+
+    def _call(self, msg):
+        if msg.procedure not in self.robot.procedures:
+            self.transport.send(message.Error(message.Call.MESSAGE_TYPE, msg.request, "wamp.error.no_such_procedure"))
+            return
+
+        def result(value):
+            if self.is_open():
+                self.transport.send(message.Result(msg.request, args=[value]))
+
+        def error(failure):
+            if self.is_open():
+                self.transport.send(message.Error(message.Call.MESSAGE_TYPE, msg.request, "wamp.error.runtime_error",
+                                                  args=[failure.getErrorMessage()]))
+
+        maybeDeferred(self.robot.call, msg.procedure, msg.kwargs or {}).addCallbacks(result, error)
+
+    def send_event(self, subscription, args, kwargs):
+        if self.is_open():
+            self.transport.send(message.Event(subscription, next(self.router.ids), args=list(args), kwargs=kwargs or None))
+
+
+class InProcessSession:
+    """
+    Stand-in for the WAMP session that hands every call straight to a simulated robot (no router, no serializer).
+    """
+
+    def __init__(self, robot):
+        self.robot = robot
+
+    def call(self, procedure, **kwargs):
+        return self.robot.call(procedure, kwargs)
+
+    def leave(self):
+        pass
+
+
+def run_on_clock(clock, d):
+    """
+    Advances clock (a twisted.internet.task.Clock) from one delayed call to the next until d has fired.
+    Returns the result of d, or raises its error.
+    """
+    done = []
+    d.addBoth(done.append)
+    while not done:
+        pending = clock.getDelayedCalls()
+        if not pending:
+            raise RuntimeError("Nothing is scheduled on the clock, but the Deferred did not fire")
+        clock.advance(min(call.getTime() for call in pending) - clock.seconds())
+    if isinstance(done[0], Failure):
+        done[0].raiseException()
+    return done[0]
+
+
+class SimulatedRouter:
+    """
+    Minimal WAMP router with a simulated robot behind every realm.
+    """
+
+    def __init__(self, robot_factory=SimulatedRobot):
+        self.robot_factory = robot_factory
+        self.robots = {}  # realm -> SimulatedRobot
+        self.sessions = set()
+        self.ids = itertools.count(1)
+        self._listening = None
+
+    def robot(self, realm):
+        """
+        Returns the robot of a realm, a new robot is made the first time a realm is joined.
+        """
+        if realm not in self.robots:
+            self.robots[realm] = self.robot_factory(realm)
+        return self.robots[realm]
+
+    def listen(self, port=DEFAULT_PORT, interface="127.0.0.1"):
+        """
+        Starts listening for WebSocket connections, returns the port (useful when port 0 was asked for).
+        """
+        factory = WampWebSocketServerFactory(lambda: _RouterSession(self), serializers=[MsgPackSerializer()])
+        self._listening = reactor.listenTCP(port, factory, interface=interface)
+        return self._listening.getHost().port
+
+    def stop(self, hang=False):
+        """
+        Stops listening and drops all the connections, like a router that goes down.
+        With hang=True the connections are left open, but nothing is read from them or sent on them anymore,
+        like a link that went dead without closing: only keepalive pings notice (the ping is never answered).
+        """
+        for session in list(self.sessions):
+            if session.hung:
+                session.transport.transport.abortConnection()
+            elif hang:
+                session.hung = True
+                session.transport.transport.pauseProducing()
+            else:
+                session.transport.close()
+        if self._listening is not None:
+            listening, self._listening = self._listening, None
+            return listening.stopListening()
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    port = int(args[0]) if args else DEFAULT_PORT
+    if "--realistic" in sys.argv:
+        router = SimulatedRouter(lambda realm: SimulatedRobot(realm, latency=ROBOT_LATENCY, jitter=0.1))
+    else:
+        router = SimulatedRouter()
+    router.listen(port)
+    print(f"Simulated robots listening on ws://127.0.0.1:{port}/ws")
+    reactor.run()
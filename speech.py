@@ -0,0 +1,70 @@
+"""
+Description: Pipelined speech for long texts, so the robot starts talking sooner and does not pause between sentences.
+             A text given to rie.dialogue.say is only spoken after the robot synthesized all of it.
+             split_utterance splits a text at its sentences, and sentences that are still long at
+             their clauses, and say sends the chunks one after the other with the next chunk
+             already on its way while the robot speaks the current one: the robot synthesizes
+             the next chunk while it talks, so the first word comes after the first chunk and
+             there is no dead air between the chunks. A gesture (a behavior) can be attached to
+             a chunk, it starts when the robot starts saying that chunk.
+             Splits are memoized, so the texts of the game (templates) are only split once.
+
+Example:
+    yield say(session, "Hi there! It is really nice to see you.", gestures={0: "BlocklyWaveRightArm"})
+"""
+
+import functools
+import re
+from collections import deque
+
+from twisted.internet.defer import inlineCallbacks
+
+MAX_CHUNK_CHARS = 120  # Sentences longer than this are split at their clauses
+MAX_IN_FLIGHT = 2  # Chunks sent but not said yet: the one being said and the next one
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_CLAUSE_END = re.compile(r"(?<=[,;:])\s+")
+
+
+@functools.lru_cache(maxsize=256)
+def split_utterance(text, max_chars=MAX_CHUNK_CHARS):
+    """
+    Splits text into chunks at sentence ends, sentences longer than max_chars also at clause ends (, ; :).
+    Clauses are joined again as long as they fit in max_chars. Returns a tuple of chunks.
+    """
+    chunks = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        if len(sentence) <= max_chars:
+            chunks.append(sentence)
+            continue
+        chunk = ""
+        for clause in _CLAUSE_END.split(sentence):
+            if chunk and len(chunk) + 1 + len(clause) > max_chars:
+                chunks.append(chunk)
+                chunk = clause
+            else:
+                chunk = f"{chunk} {clause}" if chunk else clause
+        chunks.append(chunk)
+    return tuple(chunk for chunk in chunks if chunk)
+
+
+@inlineCallbacks
+def say(session, text, gestures=None):
+    """
+    Says text (a string, or chunks that are already split) with pipelined rie.dialogue.say calls, returns when all is said.
+    gestures maps chunk numbers to behaviors that are played while that chunk is said.
+    """
+    chunks = split_utterance(text) if isinstance(text, str) else text
+    gestures = gestures or {}
+    in_flight = deque()
+    moving = []
+    for number, chunk in enumerate(chunks):
+        in_flight.append(session.call("rie.dialogue.say", text=chunk))
+        if len(in_flight) >= MAX_IN_FLIGHT:
+            yield in_flight.popleft()  # The chunk before is said, so this one is being said now
+        if number in gestures:
+            moving.append(session.call("rom.optional.behavior.play", name=gestures[number]))
+    while in_flight:
+        yield in_flight.popleft()
+    for gesture in moving:
+        yield gesture
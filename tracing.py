@@ -0,0 +1,210 @@
+"""
+Description: Latency tracing of the robot calls of a game session.
+             TracedSession wraps a WAMP session and records, for every session.call,
+             the latency (in a histogram per procedure and game phase), the number of calls
+             in flight and the errors; and for every subscription the number of events and
+             the time spent handling them. Game functions decorated with traced_phase tag
+             the calls made while they run with their name.
+             The results can be written as a Prometheus text file and as a JSON trace
+             (Chrome trace format, open it in chrome://tracing or ui.perfetto.dev), and
+             summary() gives a readable overview for the end of a session.
+             Recording a call costs a few microseconds, so it can stay on in the classroom.
+"""
+
+import functools
+import json
+import os
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+
+from twisted.internet.defer import maybeDeferred
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # Seconds, like Prometheus
+MAX_SPANS = 100000  # Calls kept for the JSON trace, the oldest are dropped first
+NO_PHASE = "none"
+
+
+class _Stats:
+    """
+    Latency histogram and error count of one (phase, procedure).
+    """
+    __slots__ = ("count", "total", "max", "errors", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.buckets = [0] * (len(BUCKETS) + 1)  # The last one is +Inf
+
+    def add(self, seconds, ok):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        if not ok:
+            self.errors += 1
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket that holds the q-quantile (the max for the +Inf bucket).
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class TracedSession:
+    """
+    Wraps a session, records every call and subscription event. Everything else is passed on to the session.
+    """
+
+    def __init__(self, session, name="session"):
+        self.session = session
+        self.name = name
+        self.phase = NO_PHASE
+        self.stats = defaultdict(_Stats)  # (phase, procedure) -> _Stats
+        self.in_flight = defaultdict(int)  # procedure -> calls in flight
+        self.max_in_flight = defaultdict(int)
+        self.events = defaultdict(_Stats)  # topic -> time spent in the event handler
+        self.phase_times = defaultdict(float)  # phase -> seconds
+        self.spans = deque(maxlen=MAX_SPANS)  # (phase, procedure, start, seconds, ok)
+        self.start = time.perf_counter()
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def call(self, procedure, *args, **kwargs):
+        phase = self.phase
+        self.in_flight[procedure] += 1
+        self.max_in_flight[procedure] = max(self.max_in_flight[procedure], self.in_flight[procedure])
+        start = time.perf_counter()
+
+        def record(result, ok):
+            seconds = time.perf_counter() - start
+            self.in_flight[procedure] -= 1
+            self.stats[phase, procedure].add(seconds, ok)
+            self.spans.append((phase, procedure, start - self.start, seconds, ok))
+            return result
+
+        d = maybeDeferred(self.session.call, procedure, *args, **kwargs)
+        d.addCallbacks(record, record, callbackArgs=(True,), errbackArgs=(False,))
+        return d
+
+    def subscribe(self, handler, topic=None, *args, **kwargs):
+        @functools.wraps(handler)
+        def traced_handler(*event_args, **event_kwargs):
+            start = time.perf_counter()
+            d = maybeDeferred(handler, *event_args, **event_kwargs)
+
+            def record(result, ok):
+                self.events[topic].add(time.perf_counter() - start, ok)
+                return result
+
+            d.addCallbacks(record, record, callbackArgs=(True,), errbackArgs=(False,))
+            return d
+
+        return self.session.subscribe(traced_handler, topic, *args, **kwargs)
+
+    def prometheus(self):
+        """
+        The metrics in the Prometheus text exposition format.
+        """
+        lines = ["# HELP guitary_rpc_duration_seconds Latency of robot calls.",
+                 "# TYPE guitary_rpc_duration_seconds histogram"]
+        for (phase, procedure), stats in sorted(self.stats.items()):
+            labels = f'session="{self.name}",phase="{phase}",procedure="{procedure}"'
+            seen = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), stats.buckets):
+                seen += count
+                lines.append(f'guitary_rpc_duration_seconds_bucket{{{labels},le="{bound}"}} {seen}')
+            lines.append(f"guitary_rpc_duration_seconds_sum{{{labels}}} {stats.total:.6f}")
+            lines.append(f"guitary_rpc_duration_seconds_count{{{labels}}} {stats.count}")
+        lines += ["# HELP guitary_rpc_errors_total Robot calls that failed.",
+                  "# TYPE guitary_rpc_errors_total counter"]
+        for (phase, procedure), stats in sorted(self.stats.items()):
+            lines.append(f'guitary_rpc_errors_total{{session="{self.name}",phase="{phase}",procedure="{procedure}"}} {stats.errors}')
+        lines += ["# HELP guitary_rpc_in_flight Robot calls waiting for a result.",
+                  "# TYPE guitary_rpc_in_flight gauge"]
+        for procedure, count in sorted(self.in_flight.items()):
+            lines.append(f'guitary_rpc_in_flight{{session="{self.name}",procedure="{procedure}"}} {count}')
+        lines += ["# HELP guitary_rpc_in_flight_max Most robot calls waiting for a result at the same time.",
+                  "# TYPE guitary_rpc_in_flight_max gauge"]
+        for procedure, count in sorted(self.max_in_flight.items()):
+            lines.append(f'guitary_rpc_in_flight_max{{session="{self.name}",procedure="{procedure}"}} {count}')
+        lines += ["# HELP guitary_events_total Subscription events handled.",
+                  "# TYPE guitary_events_total counter"]
+        for topic, stats in sorted(self.events.items()):
+            lines.append(f'guitary_events_total{{session="{self.name}",topic="{topic}"}} {stats.count}')
+        lines += ["# HELP guitary_phase_seconds_total Time spent in each game phase.",
+                  "# TYPE guitary_phase_seconds_total counter"]
+        for phase, seconds in sorted(self.phase_times.items()):
+            lines.append(f'guitary_phase_seconds_total{{session="{self.name}",phase="{phase}"}} {seconds:.6f}')
+        return "\n".join(lines) + "\n"
+
+    def trace(self):
+        """
+        The recorded calls in the Chrome trace event format, one row per procedure.
+        """
+        events = [{"name": procedure, "cat": phase, "ph": "X", "pid": self.name, "tid": procedure,
+                   "ts": round(start * 1e6), "dur": round(seconds * 1e6), "args": {"phase": phase, "ok": ok}}
+                  for phase, procedure, start, seconds, ok in self.spans]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, directory):
+        """
+        Writes <name>.prom and <name>.json to directory.
+        """
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, self.name + ".prom"), "w") as f:
+            f.write(self.prometheus())
+        with open(os.path.join(directory, self.name + ".json"), "w") as f:
+            json.dump(self.trace(), f)
+
+    def summary(self):
+        """
+        Readable overview of where the session spent its time.
+        """
+        lines = [f"Session {self.name}: {time.perf_counter() - self.start:.1f} s"]
+        for phase, seconds in sorted(self.phase_times.items(), key=lambda item: -item[1]):
+            lines.append(f"  {phase}: {seconds:.1f} s")
+        lines.append(f"  {'phase':<25}{'procedure':<30}{'calls':>6}{'mean':>8}{'p95':>8}{'max':>8}{'errors':>7}")
+        for (phase, procedure), stats in sorted(self.stats.items(), key=lambda item: -item[1].total):
+            lines.append(f"  {phase:<25}{procedure:<30}{stats.count:>6}{stats.total / stats.count:>8.2f}"
+                         f"{stats.quantile(0.95):>8.2f}{stats.max:>8.2f}{stats.errors:>7}")
+        if self.max_in_flight:
+            most = sorted(self.max_in_flight.items(), key=lambda item: (-item[1], item[0]))
+            lines.append("  most calls in flight: " + ", ".join(f"{procedure} {count}" for procedure, count in most))
+        for topic, stats in sorted(self.events.items()):
+            lines.append(f"  event {topic}: {stats.count} events, {stats.total:.2f} s in the handler")
+        return "\n".join(lines)
+
+
+def traced_phase(function):
+    """
+    Decorator for game functions (session as first argument) that tags the calls they make with their name.
+    Works on functions returning a Deferred, and does nothing when the session is not traced.
+    """
+    name = function.__name__
+
+    @functools.wraps(function)
+    def wrapper(session, *args, **kwargs):
+        if not isinstance(session, TracedSession):
+            return function(session, *args, **kwargs)
+        previous = session.phase
+        session.phase = name
+        start = time.perf_counter()
+
+        def restore(result):
+            session.phase_times[name] += time.perf_counter() - start
+            session.phase = previous
+            return result
+
+        return maybeDeferred(function, session, *args, **kwargs).addBoth(restore)
+
+    return wrapper
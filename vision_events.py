@@ -0,0 +1,146 @@
+"""
+Description: Pipeline for the event streams of the robot (e.g. rie.vision.card.stream).
+             SubscriptionRegistry keeps one subscription per topic and session, so subscribing
+             again (e.g. on every head touch) does not pile up handlers and stream starts.
+             After a reconnect, SubscriptionRegistry.rejoin makes the subscriptions of the
+             session that was lost again on the new session, with handlers made for the new session.
+             CardEventPipeline sits between the stream and the game: a card that was seen within
+             the debounce window is ignored, only one handler (speech, motion) runs at a time,
+             and frames that arrive meanwhile go to a small bounded queue that keeps only the
+             newest frames and drops the ones that got stale while waiting.
+"""
+
+import weakref
+from collections import deque
+
+from twisted.internet import reactor
+from twisted.internet.defer import DeferredList, inlineCallbacks, maybeDeferred, succeed
+
+from action_plan import branch
+
+DEBOUNCE_SECONDS = 3.0  # The same card is only handled again after it has been out of sight this long
+MAX_AGE_SECONDS = 1.0  # Queued frames older than this are dropped
+QUEUE_SIZE = 1  # Frames waiting while the handler runs, the oldest are dropped first
+
+
+class SubscriptionRegistry:
+    """
+    One subscription per topic for a session. Use SubscriptionRegistry.of(session) to get the registry of a session.
+    """
+    _registries = weakref.WeakKeyDictionary()
+    _latest = {}  # key (e.g. the realm) -> registry of the last session that joined
+
+    def __init__(self, session):
+        self.session = session
+        self._subscriptions = {}  # topic -> Deferred of the subscription
+        self._handlers = {}  # topic -> (make_handler, start procedure)
+
+    @classmethod
+    def of(cls, session):
+        if session not in cls._registries:
+            cls._registries[session] = cls(session)
+        return cls._registries[session]
+
+    @classmethod
+    def rejoin(cls, session, key):
+        """
+        Registry of a session that joined key (e.g. the realm). When an earlier session of key was lost, its topics
+        are subscribed (and their streams started) again on this session. Returns a Deferred of the registry.
+        """
+        previous = cls._latest.get(key)
+        registry = cls._latest[key] = cls.of(session)
+        if previous is None or previous is registry:
+            return succeed(registry)
+        subscribed = [registry.subscribe(topic, make_handler, start) for topic, (make_handler, start) in previous._handlers.items()]
+        return DeferredList(subscribed, consumeErrors=True).addCallback(lambda _: registry)
+
+    def __contains__(self, topic):
+        return topic in self._subscriptions
+
+    def subscribe(self, topic, make_handler, start=None):
+        """
+        Subscribes make_handler(session) to topic and calls the start procedure (e.g. the stream), only the first time.
+        The handler is made for the session, so rejoin can make a new one that talks to the session after a reconnect.
+        When the topic is already subscribed (or being subscribed) the existing subscription is returned.
+        """
+        if topic not in self._subscriptions:
+            self._handlers[topic] = (make_handler, start)
+            self._subscriptions[topic] = self._subscribe(topic, make_handler(self.session), start)
+        return branch(self._subscriptions[topic])  # Several callers can wait for the same subscription
+
+    @inlineCallbacks
+    def _subscribe(self, topic, handler, start):
+        try:
+            subscription = yield self.session.subscribe(handler, topic)
+            if start is not None:
+                yield self.session.call(start)
+        except Exception:
+            self._subscriptions.pop(topic, None)  # Let the next subscribe try again
+            raise
+        return subscription
+
+    @inlineCallbacks
+    def unsubscribe(self, topic):
+        self._handlers.pop(topic, None)
+        subscription = yield self._subscriptions.pop(topic)
+        yield subscription.unsubscribe()
+
+
+def marker_id(frame):
+    """
+    The MarkerID of a rie.vision.card.stream frame.
+    """
+    return frame[0]
+
+
+class CardEventPipeline:
+    """
+    Debounces card frames per marker and hands them to handler(marker_id) one at a time.
+    """
+
+    def __init__(self, handler, debounce=DEBOUNCE_SECONDS, max_age=MAX_AGE_SECONDS, queue_size=QUEUE_SIZE, clock=reactor):
+        self.handler = handler
+        self.debounce = debounce
+        self.max_age = max_age
+        self.clock = clock
+        self._last_seen = {}  # marker -> time it was last seen
+        self._queue = deque(maxlen=queue_size)  # (marker, time)
+        self._busy = False
+        self.handled = 0
+        self.ignored = 0  # Repeats of a card within the debounce window
+        self.dropped = 0  # Frames that were pushed out of the queue or got stale
+
+    def on_frame(self, frame):
+        """
+        Handler for the stream subscription.
+        """
+        marker = marker_id(frame)
+        now = self.clock.seconds()
+        last_seen = self._last_seen.get(marker)
+        self._last_seen[marker] = now
+        if last_seen is not None and now - last_seen < self.debounce:
+            self.ignored += 1
+            return
+        if self._busy:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append((marker, now))
+            return
+        self._handle(marker)
+
+    def _handle(self, marker):
+        self._busy = True
+        self.handled += 1
+        d = maybeDeferred(self.handler, marker)
+        d.addErrback(lambda failure: print(f"Handling card {marker} failed: {failure.getErrorMessage()}"))
+        d.addBoth(self._next)
+
+    def _next(self, _):
+        self._busy = False
+        now = self.clock.seconds()
+        while self._queue:
+            marker, seen = self._queue.popleft()
+            if now - seen <= self.max_age:
+                self._handle(marker)
+                return
+            self.dropped += 1